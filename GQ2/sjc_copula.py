@@ -4,11 +4,16 @@ Created on Wed May 15 17:49:44 2024
 
 @author: aikan
 """
+import os
+import sys
 import numpy as np
 from scipy.optimize import minimize
 import pandas as pd
 from scipy.stats import rankdata
+# Model_MSM du dossier principal, qui porte le cache des estimations MSM
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import Model_MSM as MSM
+import data_store
 
 def sjc_copula_pdf(u, v, theta, delta):
     term1 = (1 - u) ** theta + (1 - v) ** theta - (1 - u) ** theta * (1 - v) ** theta
@@ -39,16 +44,14 @@ def optimize_sjc_params(u, v, initial_params, bounds):
     return optimal_params, min_log_likelihood
 
 if __name__ == '__main__':
-    datas = pd.read_excel('SP500NASDAQ2.xls')
-    df = pd.DataFrame(datas)
-    df['DATE'] = pd.to_datetime(df['DATE'])
-    df.set_index('DATE', inplace=True)
+    # Même lecture que les scripts du dossier principal : mêmes rendements, même clé du cache MSM
+    df = data_store.load_prices('SP500NASDAQ2.xls')
 
     k_compos = 5
     index = 'SP500'
-    result_sp500, fy_sp500, Fy_sp500, pmatsp500, m0sp500, sigmasp500 = MSM.proceed_MSM_density_and_marginals_calculation(df, index, k_compos)
+    result_sp500, fy_sp500, Fy_sp500, pmatsp500, m0sp500, sigmasp500 = MSM.cached_MSM_density_and_marginals_calculation(df, index, k_compos)
     index = 'NASDAQCOM'
-    result_nasdaq, fy_nasdaq, Fy_nasdaq, pmatnasdaq, m0nasdaq, sigmanasdaq = MSM.proceed_MSM_density_and_marginals_calculation(df, index, k_compos)
+    result_nasdaq, fy_nasdaq, Fy_nasdaq, pmatnasdaq, m0nasdaq, sigmanasdaq = MSM.cached_MSM_density_and_marginals_calculation(df, index, k_compos)
 
     initial_params = [2.0, 2.0]  # Valeurs initiales pour theta et delta
     bounds = [(1e-05, np.inf), (1e-05, np.inf)]  # Bornes pour theta et delta
@@ -1,4 +1,5 @@
 import density_and_marginals
+import data_store
 import gaussian_copula
 import student_copula
 import numpy as np
@@ -16,6 +17,11 @@ from scipy.stats import multivariate_normal
 from scipy.integrate import dblquad
 from sympy import symbols, integrate, lambdify
 import calculate_MSM_VaR
+
+# Bornes des paramètres (b, gamma_k, sigma, m0) : optimisation PSO et tirage de l'espace de recherche
+MSM_BOUNDS = ([1.001, 1e-3, 1e-4, 1], [50, 0.999999, 5, 1.999999])
+SEARCH_BOUNDS = ([1.001, 1e-9, 1e-2, 1], [50, 0.999999, 3, 1.999999])
+
 class Log_likelihood_opti(Problem):
     """
     Classe propre au package pymoo pour l'optimisation.
@@ -29,10 +35,12 @@ class Log_likelihood_opti(Problem):
     def __init__(self, **kwargs):
         self.k_compos = kwargs.get("k_compos")
         self.data = kwargs.get("data")
+        xl = kwargs.pop("xl", MSM_BOUNDS[0])
+        xu = kwargs.pop("xu", MSM_BOUNDS[1])
         super().__init__(n_var=4,
                          n_obj=1,
-                         xl=[1.001, 1e-3, 1e-4, 1],
-                         xu=[50, 0.999999, 5, 1.999999],
+                         xl=xl,
+                         xu=xu,
                          **kwargs)
 
     def _evaluate(self, x, out, *args, **kwargs):
@@ -50,30 +58,35 @@ class Log_likelihood_opti(Problem):
         out["F"] = F
 
 
-def main_opti(data, k_compos):
+def main_opti(data, k_compos, seed=None, bounds=MSM_BOUNDS):
     """
     Fonction principale du modèle
     :param data: Données sous forme d'un array en deux dimensions
     :param k_compos: nombre de composants de volatilités du modèle
+    :param seed: graine de l'espace de recherche et du PSO (None : tirage non reproductible, PSO avec la graine 1)
+    :param bounds: bornes (xl, xu) des paramètres pour l'optimisation
     :return: le vecteur de volatilité estimé sur la période par le modèle
     """
     n_individuals = 30
 
     # Définition des limites utilisées seulement pour calcul des valeurs de l'espace de recherche
-    xl = np.array([1.001, 1e-9, 1e-2, 1])
-    xu = np.array([50, 0.999999, 3, 1.999999])
+    xl = np.array(SEARCH_BOUNDS[0])
+    xu = np.array(SEARCH_BOUNDS[1])
 
     # Espace de recherche des paramètres
-    search_space = np.random.rand(n_individuals, len(xl)) * (xu - xl) + xl
+    if seed is None:
+        search_space = np.random.rand(n_individuals, len(xl)) * (xu - xl) + xl
+    else:
+        search_space = np.random.default_rng(seed).random((n_individuals, len(xl))) * (xu - xl) + xl
 
     # Instantiation du Particle Swarm Algorithm et du problème
     algorithm = PSO(pop_size=20, sampling=search_space, adaptative=True, w=1)
-    problem = Log_likelihood_opti(k_compos=k_compos, data=data)
+    problem = Log_likelihood_opti(k_compos=k_compos, data=data, xl=bounds[0], xu=bounds[1])
 
     # Minimisation de l'inverse de la LL pour trouver le vecteur de paramètre optimal
     result = minimize(problem=problem,
                       algorithm=algorithm,
-                      seed=1,
+                      seed=1 if seed is None else seed,
                       verbose=True)
     params_opti = result.X
 
@@ -337,12 +350,13 @@ def data_from_df(df, index):
     return data_index
 
 
-def proceed_MSM_density_and_marginals_calculation(df, index, k_compos):
-
-    data_index = data_from_df(df, index)
-
+def fit_MSM(data_index, k_compos, seed=None, bounds=MSM_BOUNDS):
+    """
+    Estimation du MSM puis densités et marginales conditionnelles
+    :return: dictionnaire result (vol estimée), pmat, fy, Fy, params (b, gamma_k, sigma, m0)
+    """
     # Appel de l'algo pour estimer la vol
-    result_index, pmat_index, sigma_index, m0_index, b_index, gamma_index = main_opti(data_index, k_compos)
+    result_index, pmat_index, sigma_index, m0_index, b_index, gamma_index = main_opti(data_index, k_compos, seed, bounds)
     #pmat_index = pmat_index[1:]
 
     # calcul de la densité conditionnelle de f(y) à l'info en t-1
@@ -351,6 +365,18 @@ def proceed_MSM_density_and_marginals_calculation(df, index, k_compos):
     # calcul des marginales
     Fy = density_and_marginals.calcualte_marginals(data_index, pmat_index, sigma_index / 100, m0_index, k_compos)
 
+    return {'result': result_index, 'pmat': pmat_index, 'fy': fy, 'Fy': Fy,
+            'params': np.array([b_index, gamma_index, sigma_index, m0_index])}
+
+
+def proceed_MSM_density_and_marginals_calculation(df, index, k_compos, seed=None, bounds=MSM_BOUNDS):
+
+    data_index = data_from_df(df, index)
+
+    model = fit_MSM(data_index, k_compos, seed, bounds)
+    result_index, fy, Fy, pmat_index = model['result'], model['fy'], model['Fy'], model['pmat']
+    m0_index, sigma_index = model['params'][3], model['params'][2]
+
     valeurs_plot = pd.DataFrame()
     valeurs_plot["volatilité daily estimée"] = result_index
     valeurs_plot["volatilité annuelle estimée"] = result_index*np.sqrt(252)
@@ -371,6 +397,28 @@ def proceed_MSM_density_and_marginals_calculation(df, index, k_compos):
 
     return result_index, fy, Fy, pmat_index, m0_index, sigma_index
 
+
+def cached_fit_MSM(data_index, index, k_compos, seed=1, bounds=MSM_BOUNDS, store=None):
+    """
+    fit_MSM conservé dans le ModelStore sous la clé (rendements, indice, k_compos, bornes, graine)
+    et relu en memory-map ; partagé par les scripts de copules et pipeline.py
+    """
+    store = data_store.ModelStore() if store is None else store
+    key = store.key(data=data_index, index=index, k_compos=k_compos, bounds=[bounds, SEARCH_BOUNDS], seed=seed)
+    model = store.load(key)
+    if model is None:
+        model = store.save(key, fit_MSM(data_index, k_compos, seed, bounds))
+    return model
+
+
+def cached_MSM_density_and_marginals_calculation(df, index, k_compos, seed=1, bounds=MSM_BOUNDS, store=None):
+    """
+    Même sortie que proceed_MSM_density_and_marginals_calculation, l'estimation passe par cached_fit_MSM
+    """
+    model = cached_fit_MSM(data_from_df(df, index), index, k_compos, seed, bounds, store)
+    b_index, gamma_index, sigma_index, m0_index = (float(p) for p in model['params'])
+    return model['result'], model['fy'], model['Fy'], model['pmat'], m0_index, sigma_index
+
 def calculate_VaR_gc_t(z, denum1, denum2, prob1, prob2, rho, alpha):
     x_lower=-0.1
     y_lower=-0.1
@@ -404,17 +452,13 @@ def calculate_VaR_gc_t(z, denum1, denum2, prob1, prob2, rho, alpha):
 
 if __name__ == "__main__":
     # Extraction des données
-    datas = pd.read_excel('SP500NASDAQ2.xls')  # Try Latin-1 if UTF-8 fails
-
-    df = pd.DataFrame(datas)
-    df['DATE'] = pd.to_datetime(df['DATE'])
-    df.set_index('DATE', inplace=True)
+    df = data_store.load_prices('SP500NASDAQ2.xls')
 
     k_compos = 3
     index = 'SP500'
-    result_sp500, fy_sp500, Fy_sp500, pmatsp500, m0sp500, sigmasp500 = proceed_MSM_density_and_marginals_calculation(df, index, k_compos)
+    result_sp500, fy_sp500, Fy_sp500, pmatsp500, m0sp500, sigmasp500 = cached_MSM_density_and_marginals_calculation(df, index, k_compos)
     index = 'NASDAQCOM'
-    result_nasdaq, fy_nasdaq, Fy_nasdaq, pmatnasdaq, m0nasdaq, sigmanasdaq = proceed_MSM_density_and_marginals_calculation(df, index, k_compos)
+    result_nasdaq, fy_nasdaq, Fy_nasdaq, pmatnasdaq, m0nasdaq, sigmanasdaq = cached_MSM_density_and_marginals_calculation(df, index, k_compos)
 
 
 
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Backtest des VaR classiques (historique, RiskMetrics, variance-covariance, CCC-GARCH) pour tous
+les niveaux en une passe : chaque modèle est estimé une fois, seuls les quantiles changent avec
+alpha. Les méthodes tournent en parallèle et les résultats sont écrits en colonnes .npy
+(un dossier par alpha) que les scripts d'analyse ouvrent en memory-map.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from rolling_quantile import rolling_quantiles
+from rolling_moments import variance_covariance_VaR
+from ewma import ewma_VaR
+from ccc_garch import ccc_garch_VaR
+
+ASSET_COLUMNS = ['returns_SPX', 'returns_NDX']
+DEFAULT_STORE = os.path.join('..', 'datas', 'backtest')
+
+
+def historical_method(x, weights, alphas, window_size):
+    return rolling_quantiles(x @ weights, window_size, np.asarray(alphas) * 100)
+
+
+def variance_covariance_method(x, weights, alphas, window_size):
+    return variance_covariance_VaR(x, window_size, weights, alphas)[:, 0, :]
+
+
+def riskmetrics_method(x, weights, alphas, window_size, lambda_param=0.94):
+    return ewma_VaR(x, weights, window_size, [lambda_param], alphas)[:, 0, 0, :]
+
+
+def ccc_garch_method(x, weights, alphas, window_size, refit_every=1):
+    return ccc_garch_VaR(x, weights, window_size, alphas, refit_every)[:-1]
+
+
+# Colonnes de sortie (noms des fichiers VaR_{alpha}.xlsx) -> méthode, chacune renvoie (T x len(alphas))
+METHODS = {
+    'VaR_historique': historical_method,
+    'VaR_riskmetrics': riskmetrics_method,
+    'Var_cov': variance_covariance_method,
+    'VaR_CCC_GARCH': ccc_garch_method,
+}
+
+
+def run_backtest(df, weights, alphas=(0.05, 0.01), window_size=1135, methods=None, n_jobs=len(METHODS),
+                 output_dir=DEFAULT_STORE):
+    """
+    :param df: DataFrame avec returns_SPX, returns_NDX (et éventuellement Dates)
+    :return: {alpha: DataFrame des VaR à partir de la ligne window_size}
+    """
+    methods = list(METHODS) if methods is None else methods
+    x = df[ASSET_COLUMNS].to_numpy(dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+
+    if n_jobs == 1:
+        VaR = {name: METHODS[name](x, weights, alphas, window_size) for name in methods}
+    else:
+        with ProcessPoolExecutor(min(n_jobs, len(methods))) as pool:
+            futures = {name: pool.submit(METHODS[name], x, weights, alphas, window_size) for name in methods}
+            VaR = {name: future.result() for name, future in futures.items()}
+
+    results = {}
+    for k, alpha in enumerate(alphas):
+        columns = {}
+        if 'Dates' in df:
+            columns['Dates'] = pd.to_datetime(df['Dates']).to_numpy()[window_size:]
+        columns['returns_portfolio'] = (x @ weights)[window_size:]
+        for name in methods:
+            columns[name] = VaR[name][window_size:, k]
+        results[alpha] = pd.DataFrame(columns, index=df.index[window_size:])
+        if output_dir is not None:
+            save_columns(results[alpha], os.path.join(output_dir, f'VaR_{alpha}'))
+    return results
+
+
+def save_columns(df, directory):
+    """
+    Une colonne par fichier .npy, l'ordre des colonnes dans columns.txt
+    """
+    os.makedirs(directory, exist_ok=True)
+    for column in df.columns:
+        np.save(os.path.join(directory, f'{column}.npy'), df[column].to_numpy())
+    with open(os.path.join(directory, 'columns.txt'), 'w') as f:
+        f.write('\n'.join(df.columns))
+
+
+def load_backtest(alpha, directory=DEFAULT_STORE, columns=None, mmap_mode='r'):
+    """
+    Relit les colonnes d'un niveau (en memory-map), index 0..n-1 comme read_excel sur les anciens
+    VaR_{alpha}.xlsx ; à défaut de dossier, lit l'ancien fichier
+    """
+    path = os.path.join(directory, f'VaR_{alpha}')
+    if not os.path.isdir(path):
+        return pd.read_excel(os.path.join(os.path.dirname(os.path.normpath(directory)), f'VaR_{alpha}.xlsx'))
+    if columns is None:
+        with open(os.path.join(path, 'columns.txt')) as f:
+            columns = f.read().split('\n')
+    data = {column: np.load(os.path.join(path, f'{column}.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+            for column in columns}
+    return pd.DataFrame(data, copy=False)
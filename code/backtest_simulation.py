@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Taille et puissance à distance finie des tests de backtest (uc, ind, cc, durées).
+
+Les suites de dépassements sont simulées par une chaîne de Markov à deux états
+(P(1 | 0) = p01, P(1 | 1) = p11 ; Bernoulli quand p01 = p11) directement dans un noyau numba
+parallèle : chaque suite a sa propre graine, le résultat ne dépend donc pas du nombre de cœurs.
+Seuls les comptages de transitions et la statistique de durées sortent du noyau ; uc, ind et cc
+sont ensuite calculés comme pour les vraies VaR (backtest_stats.coverage_statistics).
+"""
+import numpy as np
+import pandas as pd
+from numba import jit, prange
+from scipy.stats import chi2
+from backtest_stats import coverage_statistics, _spells, _duration_statistic
+
+TESTS = {'uc': 1, 'ind': 1, 'cc': 2, 'duration': 1}
+
+
+@jit(nopython=True, parallel=True)
+def _simulate_counts(n_sim, n_obs, p01, p11, seed, counts, n_hits, duration):
+    # premier état tiré dans la loi stationnaire de la chaîne
+    stationary = p01 / (1 - p11 + p01)
+    for i in prange(n_sim):
+        np.random.seed(seed + i)
+        hits = np.empty(n_obs, dtype=np.int8)
+        durations = np.empty(n_obs + 1)
+        censored = np.empty(n_obs + 1, dtype=np.bool_)
+        state = 1 if np.random.random() < stationary else 0
+        hits[0] = state
+        n_hits[i] = state
+        for t in range(1, n_obs):
+            new = 1 if np.random.random() < (p11 if state == 1 else p01) else 0
+            counts[i, state, new] += 1
+            hits[t] = new
+            n_hits[i] += new
+            state = new
+        n = _spells(hits, durations, censored)
+        duration[i] = _duration_statistic(durations[:n], censored[:n])
+
+
+def simulate_statistics(n_sim, n_obs, alpha, p01=None, p11=None, seed=0):
+    """
+    Statistiques LR de n_sim suites de n_obs dépassements
+    :param alpha: niveau testé (hypothèse nulle)
+    :param p01, p11: probabilités de transition de la loi simulée (alpha par défaut : suites sous H0)
+    :return: dictionnaire de tableaux (n_sim,) : EFV, LR_uc, LR_ind, LR_cc, LR_duration
+    """
+    p01 = alpha if p01 is None else p01
+    p11 = p01 if p11 is None else p11
+    counts = np.zeros((n_sim, 2, 2), dtype=np.int64)
+    n_hits = np.zeros(n_sim, dtype=np.int64)
+    duration = np.empty(n_sim)
+    _simulate_counts(n_sim, n_obs, float(p01), float(p11), seed, counts, n_hits, duration)
+    statistics = coverage_statistics(counts, np.full(n_sim, n_obs), n_hits, alpha)
+    statistics['LR_duration'] = duration
+    return statistics
+
+
+def critical_values(statistics, levels=(0.10, 0.05, 0.01)):
+    """
+    Quantiles 1 - level des statistiques simulées sous H0 ; une statistique non définie
+    (moins de deux dépassements pour les durées, aucun dépassement suivi d'une date pour ind et cc)
+    compte comme une absence de rejet
+    :return: DataFrame (tests x niveaux) avec, pour comparaison, les valeurs asymptotiques du chi2
+    """
+    rows = []
+    for test, dof in TESTS.items():
+        values = np.nan_to_num(statistics[f'LR_{test}'], nan=0.0)
+        for level in levels:
+            rows.append({'test': test, 'level': level,
+                         'critical_value': np.quantile(values, 1 - level),
+                         'chi2_critical_value': chi2.ppf(1 - level, dof),
+                         'chi2_size': np.mean(values > chi2.ppf(1 - level, dof))})
+    return pd.DataFrame(rows)
+
+
+def size_power_study(n_obs_list, alpha, alternatives, n_sim=100_000, levels=(0.05,), seed=0):
+    """
+    :param n_obs_list: longueurs d'échantillon (ex. [100, 250, 500])
+    :param alternatives: {nom: (p01, p11)} lois simulées sous H1 (ex. {'sous-couverture': (0.08, 0.08),
+                         'grappes': (0.03, 0.3)})
+    :return: table (n_obs, scénario, test, niveau) : valeur critique simulée, taux de rejet avec
+             la valeur critique du chi2 (size / puissance asymptotique) et avec la valeur simulée
+             (puissance corrigée de la taille)
+    """
+    tables = []
+    for n_obs in n_obs_list:
+        null = simulate_statistics(n_sim, n_obs, alpha, seed=seed)
+        critical = critical_values(null, levels)
+        scenarios = {'H0': null}
+        for k, (name, (p01, p11)) in enumerate(alternatives.items()):
+            scenarios[name] = simulate_statistics(n_sim, n_obs, alpha, p01, p11, seed=seed + (k + 1) * n_sim)
+        for name, statistics in scenarios.items():
+            table = critical.copy()
+            values = [np.nan_to_num(statistics[f'LR_{test}'], nan=0.0) for test in table['test']]
+            table['rejection_chi2'] = [np.mean(v > c) for v, c in zip(values, table['chi2_critical_value'])]
+            table['rejection_simulated'] = [np.mean(v > c) for v, c in zip(values, table['critical_value'])]
+            table.insert(0, 'scenario', name)
+            table.insert(0, 'n_obs', n_obs)
+            tables.append(table.drop(columns='chi2_size'))
+    return pd.concat(tables, ignore_index=True)
+
+
+def simulated_p_values(statistics, null):
+    """
+    p-values empiriques des statistiques observées (dictionnaire de backtest_stats) sous la loi
+    simulée de null (mêmes n_obs et alpha)
+    """
+    p_values = {}
+    for test in TESTS:
+        reference = np.sort(np.nan_to_num(null[f'LR_{test}'], nan=0.0))
+        observed = np.asarray(statistics[f'LR_{test}'])
+        exceed = len(reference) - np.searchsorted(reference, observed, side='left')
+        p_values[f'p_{test}'] = np.where(np.isnan(observed), np.nan, (exceed + 1) / (len(reference) + 1))
+    return p_values
+
+
+if __name__ == "__main__":
+
+    alternatives = {'sous-couverture': (0.075, 0.075), 'grappes': (0.04, 0.25)}
+    for alpha in (0.05, 0.01):
+        results = size_power_study([100, 250, 500], alpha, alternatives, n_sim=200_000)
+        pd.set_option('display.max_columns', None)
+        print(results)
+        results.to_csv(f'Backtest_size_power_{alpha}.csv', index=False)
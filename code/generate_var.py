@@ -1,108 +1,48 @@
+import os
+import sys
 import pandas as pd
 import numpy as np
 from scipy.stats import norm
 from arch import arch_model
+from rolling_quantile import rolling_quantiles
+from rolling_moments import variance_covariance_VaR
+from ewma import ewma_VaR
+from ccc_garch import ccc_garch_VaR
+from backtest_runner import run_backtest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import data_store
 
 def historical_VaR(df, confidence_level, window_size=1135):
-    df['VaR_historique'] = np.nan
-    for i in range(window_size, len(df)):
-        df.loc[df.index[i], 'VaR_historique'] = np.percentile(df['returns_portfolio'].iloc[i-window_size:i].dropna(),
-                                                              confidence_level)
+    # Percentile glissant sur [i - window_size, i), valeurs manquantes ignorées
+    df['VaR_historique'] = rolling_quantiles(df['returns_portfolio'].to_numpy(), window_size, [confidence_level])[:, 0]
 
     return df
 
 def variance_covariance_method(df, weights, window_size=1135, confidence_level = 0.05):
-    df['Var_cov'] = np.nan
-
-    for i in range(window_size, len(df)):
-        # Sélection de la fenêtre pour les calculs
-        window = df.iloc[i - window_size:i]
-        mean_returns = window[['returns_SPX', 'returns_NDX']].mean()
-        cov_matrix = window[['returns_SPX', 'returns_NDX']].cov()
-
-        # Calcul de la variance du portefeuille
-        portfolio_variance = np.dot(weights.T, np.dot(cov_matrix, weights))
-        portfolio_std = np.sqrt(portfolio_variance)
-
-        # Moyenne des rendements du portefeuille
-        mean_portfolio_return = np.dot(weights, mean_returns)
-
-        # Quantile de la distribution normale
-        Z_alpha = norm.ppf(1 - confidence_level)
-
-        # Calcul de la VaR
-        VaR = -(mean_portfolio_return + portfolio_std * Z_alpha)
-        df.loc[df.index[i], 'Var_cov'] = VaR
+    # Moyenne et covariance glissantes mises à jour pas à pas (Welford)
+    VaR = variance_covariance_VaR(df[['returns_SPX', 'returns_NDX']].to_numpy(), window_size, weights,
+                                  [confidence_level])
+    df['Var_cov'] = VaR[:, 0, 0]
 
     return df
 
 
 def riskmetrics_VaR(df, weights, window_size=1135, lambda_param=0.94, confidence_level=0.05):
-    df['VaR_riskmetrics'] = np.nan
-
-    # Sélection de la fenêtre pour les calculs
-    initial_window = df.iloc[:window_size]
-    cov_matrix = initial_window[['returns_SPX', 'returns_NDX']].cov()
-    initial_variance = np.dot(weights.T, np.dot(cov_matrix, weights))
-
-    df.loc[window_size-1, 'portfolio_variance'] = initial_variance
-    for i in range(window_size, len(df)):
-        yesterday_var = df.loc[i - 1, 'portfolio_variance']
-        today_return = df.loc[i, 'returns_portfolio']
-        today_var = lambda_param * yesterday_var + (1 - lambda_param) * today_return ** 2
-        df.loc[i, 'portfolio_variance'] = today_var
-        mean_returns = df[['returns_SPX', 'returns_NDX']].iloc[i-window_size:i].mean()
-
-        # Calcul de la VaR
-        std_dev = np.sqrt(today_var)
-        Z_alpha = norm.ppf(1 - confidence_level)
-        df.loc[i, 'VaR_riskmetrics'] = -(mean_returns.dot(weights) + Z_alpha * std_dev)
+    # Récursion EWMA calculée comme un filtre linéaire sur toute la série
+    VaR = ewma_VaR(df[['returns_SPX', 'returns_NDX']].to_numpy(), weights, window_size, [lambda_param],
+                   [confidence_level])
+    df['VaR_riskmetrics'] = VaR[:, 0, 0, 0]
 
     return df
 
 
-def calculate_CCC_GARCH_VaR(df, weights, initial_window_size=1135, confidence_level=0.05):
-    df['VaR_CCC_GARCH'] = np.nan
-
-    # Initialisation du modèle GARCH et fit
-    volatilities = {asset: [] for asset in ['returns_SPX', 'returns_NDX']}
-    residuals = {asset: [] for asset in ['returns_SPX', 'returns_NDX']}
-    garch_models = {}
-    for asset in ['returns_SPX', 'returns_NDX']:
-        model = arch_model(df[asset][1:initial_window_size], vol='Garch', p=1, q=1, mean='Constant')
-        fitted = model.fit(disp='off')
-        garch_models[asset] = fitted
-        volatilities[asset].extend(fitted.conditional_volatility.tolist())
-        residuals[asset].extend((fitted.resid / fitted.conditional_volatility).tolist())
-
-    # Rolling forecast du CCC-GARCH
-    for t in range(initial_window_size-1, len(df)):
-        for asset in ['returns_SPX', 'returns_NDX']:
-            model = arch_model(df[asset][1:t + 1], vol='Garch', p=1, q=1, mean='Constant')
-            res = model.fit(last_obs=t + 1, disp='off')
-            last_vol = res.conditional_volatility.iloc[-1]
-            last_res = res.resid.iloc[-1] / last_vol
-
-            volatilities[asset].append(last_vol)
-            residuals[asset].append(last_res)
-
-        # MaJ de la correlation matrix
-        current_residuals = pd.DataFrame({asset: res for asset, res in residuals.items()})
-        current_correlation = current_residuals.iloc[-initial_window_size:].corr().values
-
-        # Construction de  D_t et Omega_t au temps t
-        D_t = np.diag([volatilities[asset][t] for asset in ['returns_SPX', 'returns_NDX']])
-        Omega_t = D_t @ current_correlation @ D_t
-
-        # Calculate portfolio variance
-        portfolio_variance = weights @ Omega_t @ weights.T
-
-        # On assume que les rendements sont nuls
-        mean_portfolio_return = 0
-
-        # Calcul de la VaR
-        Z_alpha = norm.ppf(1 - confidence_level)
-        df.loc[t+1, 'VaR_CCC_GARCH'] = -(mean_portfolio_return + np.sqrt(portfolio_variance) * Z_alpha)
+def calculate_CCC_GARCH_VaR(df, weights, initial_window_size=1135, confidence_level=0.05, refit_every=1):
+    # GARCH ré-estimés chaque jour par défaut ; avec refit_every > 1, filtrés pas à pas entre deux estimations
+    VaR = ccc_garch_VaR(df[['returns_SPX', 'returns_NDX']].to_numpy(), weights, initial_window_size,
+                        [confidence_level], refit_every)
+    df['VaR_CCC_GARCH'] = VaR[:-1, 0]
+    # Prévision du jour suivant la dernière date (ligne ajoutée, comme df.loc[t+1] auparavant)
+    df.loc[len(df), 'VaR_CCC_GARCH'] = VaR[-1, 0]
 
     return df
 
@@ -112,10 +52,8 @@ def calculate_CCC_GARCH_VaR(df, weights, initial_window_size=1135, confidence_le
 # =============================================================================
 if __name__ == "__main__":
     # Extraction des données
-    df = pd.read_excel(r'../datas/SP500NASDAQ.xlsx')
-    df["SP500"] = pd.to_numeric(df["SP500"], errors="coerce")
-    df["NASDAQCOM"] = pd.to_numeric(df["NASDAQCOM"], errors="coerce")
-    df = df[df["SP500"].notna() & df["NASDAQCOM"].notna()]
+    # Données lues depuis le cache, dates où l'un des indices manque retirées
+    df = data_store.load_prices(r'../datas/SP500NASDAQ.csv', complete=True).rename_axis('Dates').reset_index()
 
     # Définir les poids du portefeuille
     weights = np.array([0.5, 0.5])
@@ -127,21 +65,16 @@ if __name__ == "__main__":
     # Pondérez les rendements en fonction de leur poids dans le portefeuille
     df['returns_portfolio'] = weights[0] * df['returns_SPX'] + weights[1] * df['returns_NDX']
 
-    df_ini = df.copy()
-
-    for alpha in [0.05, 0.01]:
+    # =============================================================================
+    # Utilisation des modèles VaR : tous les niveaux en une passe, méthodes en parallèle,
+    # résultats en colonnes .npy dans ../datas/backtest/VaR_{alpha}
+    # =============================================================================
+    results = run_backtest(df, weights, alphas=[0.05, 0.01], window_size=1135)
+    results_store = data_store.ResultsStore()
+    for alpha, returns in results.items():
         print(f'\nVaR à  {100-alpha*100}%')
-        df = df_ini.copy()
-
-        # =============================================================================
-        # Utilisation des modèles VaR
-        # =============================================================================
-
-        var_historique = historical_VaR(df, confidence_level=alpha * 100)
-        var_cov = variance_covariance_method(df, weights, confidence_level=alpha)
-        var_riskmetrics = riskmetrics_VaR(df, weights, confidence_level=alpha)
-        var_ccc_garch = calculate_CCC_GARCH_VaR(df, weights, confidence_level=alpha)
-
-        returns = df.iloc[1135:-1]
-        returns.to_excel(f'../datas/VaR_{alpha}.xlsx')
+        print(returns.tail())
+        # Historique des VaR datées (seules les nouvelles dates sont ajoutées)
+        for column in returns.columns.drop(['Dates', 'returns_portfolio']):
+            results_store.append(f'{column}_{alpha}', returns['Dates'], returns[column])
 
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Comparaison des modèles de VaR par leurs pertes : perte quantile (tick loss), tests de
+Diebold-Mariano deux à deux et Model Confidence Set (Hansen, Lunde et Nason, 2011) par
+bootstrap stationnaire (Politis et Romano, 1994).
+
+La matrice des pertes (T x M) est calculée une fois. Une réplication bootstrap n'est qu'un
+vecteur d'indices ; les moyennes des pertes rééchantillonnées s'obtiennent par le produit des
+effectifs de tirage de chaque date (B x T) avec la matrice des pertes, sans copier de séries.
+Les réplications sont réparties par blocs de taille fixe, chacun avec sa graine : le résultat
+ne dépend pas du nombre de processus.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+from backtest_runner import load_backtest
+
+# Nombre de réplications par tâche
+BOOTSTRAP_CHUNK = 1000
+
+
+def tick_loss(returns, VaR, alpha):
+    """
+    Perte quantile de la VaR de t-1 (quantile alpha des rendements) face au rendement de t :
+    (alpha - 1{r_t < VaR_(t-1)}) (r_t - VaR_(t-1))
+    :param VaR: (T x M)
+    :return: pertes (T - 1 x M), NaN là où la VaR ou le rendement manque
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    VaR = np.asarray(VaR, dtype=np.float64).reshape(len(returns), -1)
+    error = returns[1:, None] - VaR[:-1]
+    return (alpha - (error < 0)) * error
+
+
+def loss_matrix(df, columns, alpha, returns_column='returns_portfolio'):
+    """
+    Pertes de chaque colonne de VaR sur les dates où toutes les colonnes sont disponibles
+    :return: DataFrame (dates x modèles)
+    """
+    losses = tick_loss(df[returns_column].to_numpy(dtype=np.float64), df[columns].to_numpy(dtype=np.float64), alpha)
+    losses = pd.DataFrame(losses, index=df.index[1:], columns=columns)
+    return losses.dropna()
+
+
+def stationary_bootstrap_indices(n_obs, n_boot, block_length, rng):
+    """
+    Indices du bootstrap stationnaire : blocs de longueur géométrique de moyenne block_length,
+    débuts uniformes, lecture circulaire
+    :return: tableau (n_boot x n_obs)
+    """
+    starts = rng.integers(0, n_obs, size=(n_boot, n_obs))
+    new_block = rng.random((n_boot, n_obs)) < 1 / block_length
+    new_block[:, 0] = True
+    positions = np.arange(n_obs)
+    # position du début du bloc courant
+    block_start = np.maximum.accumulate(np.where(new_block, positions, 0), axis=1)
+    return (np.take_along_axis(starts, block_start, axis=1) + positions - block_start) % n_obs
+
+
+def _bootstrap_chunk(losses, n_boot, block_length, seed, chunk):
+    rng = np.random.default_rng([seed, chunk])
+    n_obs = losses.shape[0]
+    indices = stationary_bootstrap_indices(n_obs, n_boot, block_length, rng)
+    # effectifs de tirage de chaque date dans chaque réplication
+    offsets = (np.arange(n_boot)[:, None] * n_obs + indices).ravel()
+    draws = np.bincount(offsets, minlength=n_boot * n_obs).reshape(n_boot, n_obs)
+    return draws @ losses / n_obs
+
+
+def bootstrap_mean_losses(losses, n_boot=10000, block_length=10, seed=0, n_jobs=1, chunk_size=BOOTSTRAP_CHUNK):
+    """
+    Moyennes des pertes de chaque modèle sur n_boot réplications du bootstrap stationnaire
+    :return: tableau (n_boot x M)
+    """
+    losses = np.ascontiguousarray(losses, dtype=np.float64)
+    chunks = [(chunk, min(chunk_size, n_boot - start)) for chunk, start in enumerate(range(0, n_boot, chunk_size))]
+    if n_jobs == 1:
+        results = [_bootstrap_chunk(losses, size, block_length, seed, chunk) for chunk, size in chunks]
+    else:
+        with ProcessPoolExecutor(n_jobs) as pool:
+            futures = [pool.submit(_bootstrap_chunk, losses, size, block_length, seed, chunk) for chunk, size in chunks]
+            results = [future.result() for future in futures]
+    return np.concatenate(results)
+
+
+def diebold_mariano(losses, lags=None):
+    """
+    Tests de Diebold-Mariano de tous les couples, variance de long terme de Newey-West
+    :param losses: DataFrame (dates x modèles)
+    :param lags: nombre de retards (T^(1/3) par défaut)
+    :return: statistiques et p-values bilatérales (modèles x modèles) ; une statistique positive
+             signifie que le modèle en ligne a une perte plus élevée que le modèle en colonne
+    """
+    values = losses.to_numpy(dtype=np.float64)
+    n_obs = len(values)
+    lags = int(np.floor(n_obs ** (1 / 3))) if lags is None else lags
+    differential = values[:, :, None] - values[:, None, :]
+    mean = differential.mean(axis=0)
+    centered = differential - mean
+    long_run = (centered ** 2).mean(axis=0)
+    for lag in range(1, lags + 1):
+        weight = 1 - lag / (lags + 1)
+        long_run += 2 * weight * (centered[lag:] * centered[:-lag]).sum(axis=0) / n_obs
+    with np.errstate(divide='ignore', invalid='ignore'):
+        statistic = mean / np.sqrt(long_run / n_obs)
+    p_value = 2 * norm.sf(np.abs(statistic))
+    return (pd.DataFrame(statistic, index=losses.columns, columns=losses.columns),
+            pd.DataFrame(p_value, index=losses.columns, columns=losses.columns))
+
+
+def model_confidence_set(losses, n_boot=10000, block_length=10, seed=0, n_jobs=1, confidence=0.9,
+                         chunk_size=BOOTSTRAP_CHUNK):
+    """
+    MCS avec la statistique T_max : à chaque étape le modèle dont la perte relative à la moyenne
+    de l'ensemble est la plus significativement élevée est éliminé
+    :return: DataFrame (modèles, dans l'ordre d'élimination) : perte moyenne, p-value MCS,
+             appartenance à l'ensemble de niveau confidence
+    """
+    values = losses.to_numpy(dtype=np.float64)
+    mean_loss = values.mean(axis=0)
+    boot_loss = bootstrap_mean_losses(values, n_boot, block_length, seed, n_jobs, chunk_size)
+
+    remaining = list(range(values.shape[1]))
+    eliminated, p_values = [], []
+    p_max = 0.0
+    while len(remaining) > 1:
+        relative = mean_loss[remaining] - mean_loss[remaining].mean()
+        boot_relative = boot_loss[:, remaining] - boot_loss[:, remaining].mean(axis=1, keepdims=True)
+        std = np.sqrt(((boot_relative - relative) ** 2).mean(axis=0))
+        statistic = relative / std
+        boot_statistic = ((boot_relative - relative) / std).max(axis=1)
+        p_max = max(p_max, np.mean(boot_statistic >= statistic.max()))
+        worst = remaining[int(np.argmax(statistic))]
+        eliminated.append(worst)
+        p_values.append(p_max)
+        remaining.remove(worst)
+    eliminated.append(remaining[0])
+    p_values.append(1.0)
+
+    return pd.DataFrame({'mean_loss': mean_loss[eliminated], 'p_MCS': p_values,
+                         'in_MCS': np.asarray(p_values) >= 1 - confidence},
+                        index=losses.columns[eliminated])
+
+
+# =============================================================================
+# Exécution du code principal
+# =============================================================================
+if __name__ == "__main__":
+
+    pd.set_option('display.max_columns', None)
+    classic_columns = ['Dates', 'returns_portfolio', 'VaR_historique', 'VaR_riskmetrics', 'Var_cov', 'VaR_CCC_GARCH']
+
+    for alpha, suffix in ((0.05, 95), (0.01, 99)):
+        classic_var = load_backtest(alpha)[classic_columns].iloc[-500:]
+        garch_var = pd.read_csv(rf'../datas/Garch_VaR_{suffix}.csv')
+        df = classic_var.merge(garch_var, left_index=True, right_index=True)
+        columns = df.drop(['Dates', 'returns_portfolio'], axis=1).columns.tolist()
+
+        samples = {'all': loss_matrix(df, columns, alpha)}
+        if alpha == 0.05:
+            # la VaR MSM (95 %) ne couvre que les 100 dernières dates : comparaison sur cet échantillon
+            MSM_var = pd.read_csv(rf'../datas/MSM_VaR.csv').rename(columns={'0': 'MSM_var'})
+            MSM_var['MSM_var'] = MSM_var['MSM_var'].apply(lambda x: x * 100)
+            MSM_var.index = df.index[-100:]
+            samples['MSM'] = loss_matrix(df.join(MSM_var), columns + ['MSM_var'], alpha)
+
+        for name, losses in samples.items():
+            statistic, p_value = diebold_mariano(losses)
+            print(p_value.round(3))
+            p_value.round(3).to_csv(f'Diebold_Mariano_{suffix}_{name}.csv')
+
+            mcs = model_confidence_set(losses, n_jobs=4)
+            print(mcs)
+            mcs.to_csv(f'MCS_{suffix}_{name}.csv')
@@ -1,5 +1,6 @@
 import matplotlib.pyplot as plt
 import pandas as pd
+from backtest_runner import load_backtest
 
 def plot_var_95(df, alpha):
     fig, ax = plt.subplots(figsize=(12, 6))
@@ -67,7 +68,7 @@ def plot_var_garch(df, alpha):
 
 if __name__ == "__main__":
 
-    classic_var_95 = pd.read_excel(rf'../datas/VaR_0.05.xlsx')
+    classic_var_95 = load_backtest(0.05)
     classic_var_95 = classic_var_95[['Dates', 'returns_portfolio', 'VaR_historique', 'VaR_riskmetrics', 'Var_cov', 'VaR_CCC_GARCH']]
     classic_var_95 = classic_var_95.iloc[-500:]
 
@@ -87,7 +88,7 @@ if __name__ == "__main__":
     # Plot Var 99
     # =============================================================================
 
-    classic_var_99 = pd.read_excel(rf'../datas/VaR_0.01.xlsx')
+    classic_var_99 = load_backtest(0.01)
     classic_var_99 = classic_var_99[['Dates', 'returns_portfolio', 'VaR_historique', 'VaR_riskmetrics', 'Var_cov', 'VaR_CCC_GARCH']]
     classic_var_99 = classic_var_99.iloc[-500:]
 
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Moyenne et covariance glissantes mises à jour en O(N²) par pas (Welford : ajout de la nouvelle
+ligne, retrait de la plus ancienne), sans recalcul sur la fenêtre.
+
+Convention de pandas : fenêtre [i - window_size, i), covariance empirique (ddof = 1) ;
+une ligne contenant une valeur manquante est ignorée.
+"""
+import numpy as np
+from numba import jit
+from scipy.stats import norm
+
+
+@jit(nopython=True)
+def _welford_add(mean, comoment, n, x):
+    n += 1
+    delta = x - mean
+    mean += delta / n
+    comoment += np.outer(delta, x - mean)
+    return n
+
+
+@jit(nopython=True)
+def _welford_remove(mean, comoment, n, x):
+    if n == 1:
+        mean[:] = 0.0
+        comoment[:, :] = 0.0
+        return 0
+    delta = x - mean
+    n -= 1
+    mean -= delta / n
+    comoment -= np.outer(delta, x - mean)
+    return n
+
+
+@jit(nopython=True)
+def _rolling_moments(x, window_size, weights, out_mean, out_var, out_cov, store_cov):
+    n_assets = x.shape[1]
+    mean = np.zeros(n_assets)
+    comoment = np.zeros((n_assets, n_assets))
+    n = 0
+    for i in range(1, x.shape[0]):
+        new = x[i - 1]
+        if not np.any(np.isnan(new)):
+            n = _welford_add(mean, comoment, n, new)
+        if i - 1 - window_size >= 0:
+            old = x[i - 1 - window_size]
+            if not np.any(np.isnan(old)):
+                n = _welford_remove(mean, comoment, n, old)
+        if i < window_size or n < 2:
+            continue
+        cov = comoment / (n - 1)
+        if store_cov:
+            out_cov[i] = cov
+        for k in range(weights.shape[0]):
+            out_mean[i, k] = weights[k] @ mean
+            out_var[i, k] = weights[k] @ cov @ weights[k]
+
+
+def rolling_moments(x, window_size, weights=None, store_cov=True):
+    """
+    :param x: rendements (T x N)
+    :param weights: vecteurs de poids (K x N) ou (N,) ; par défaut poids égaux
+    :return: moyenne et variance de chaque portefeuille (T x K), covariances (T x N x N) si store_cov
+    """
+    x = np.ascontiguousarray(x, dtype=np.float64)
+    if weights is None:
+        weights = np.full(x.shape[1], 1 / x.shape[1])
+    weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+    out_mean = np.full((x.shape[0], weights.shape[0]), np.nan)
+    out_var = np.full((x.shape[0], weights.shape[0]), np.nan)
+    out_cov = np.full((x.shape[0], x.shape[1], x.shape[1]) if store_cov else (1, 1, 1), np.nan)
+    _rolling_moments(x, window_size, weights, out_mean, out_var, out_cov, store_cov)
+    return out_mean, out_var, (out_cov if store_cov else None)
+
+
+def variance_covariance_VaR(x, window_size, weights, confidence_levels=(0.05, 0.01)):
+    """
+    VaR paramétrique -(moyenne + écart-type * z_(1-alpha)) de plusieurs portefeuilles
+    et plusieurs niveaux à partir du même flux de covariances
+    :return: tableau (T x K x len(confidence_levels))
+    """
+    portfolio_mean, portfolio_var, _ = rolling_moments(x, window_size, weights, store_cov=False)
+    z_alpha = norm.ppf(1 - np.asarray(confidence_levels))
+    return -(portfolio_mean[..., None] + np.sqrt(portfolio_var)[..., None] * z_alpha)
+
+
+class RollingMoments:
+    """
+    Version pas à pas : push(x) ajoute une ligne et retire celle sortie de la fenêtre
+    """
+    def __init__(self, n_assets, window_size):
+        self.window_size = window_size
+        self.buffer = np.full((window_size, n_assets), np.nan)
+        self.position = 0
+        self.n = 0
+        self.mean = np.zeros(n_assets)
+        self.comoment = np.zeros((n_assets, n_assets))
+
+    def push(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        old = self.buffer[self.position]
+        if not np.any(np.isnan(old)):
+            self.n = _welford_remove(self.mean, self.comoment, self.n, old)
+        if not np.any(np.isnan(x)):
+            self.n = _welford_add(self.mean, self.comoment, self.n, x)
+        self.buffer[self.position] = x
+        self.position = (self.position + 1) % self.window_size
+
+    def extend(self, rows):
+        for x in rows:
+            self.push(x)
+
+    @property
+    def cov(self):
+        return self.comoment / (self.n - 1)
+
+    @property
+    def correlation(self):
+        std = np.sqrt(np.diag(self.comoment))
+        return self.comoment / np.outer(std, std)
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Quantiles glissants par arbre de Fenwick.
+
+Les observations sont compressées en rangs (une case par observation, ex aequo départagés par
+la position) ; la fenêtre est un arbre de Fenwick de comptages : ajout et retrait en O(log T),
+k-ième plus petite valeur en O(log T) par descente binaire. Les quantiles reproduisent
+np.percentile (interpolation linéaire) sur les valeurs non manquantes de la fenêtre
+[i - window_size, i).
+"""
+import numpy as np
+from numba import jit
+
+
+@jit(nopython=True)
+def _fenwick_add(tree, slot, delta):
+    i = slot + 1
+    while i < len(tree):
+        tree[i] += delta
+        i += i & (-i)
+
+
+@jit(nopython=True)
+def _fenwick_kth(tree, k, top_bit):
+    """
+    Case de la k-ième (0-indexée) plus petite valeur présente
+    """
+    position = 0
+    remaining = k + 1
+    step = top_bit
+    while step > 0:
+        nxt = position + step
+        if nxt < len(tree) and tree[nxt] < remaining:
+            position = nxt
+            remaining -= tree[nxt]
+        step >>= 1
+    return position
+
+
+@jit(nopython=True)
+def _rolling_quantiles(x, slots, sorted_values, window_size, fractions, out):
+    n_slots = len(sorted_values)
+    tree = np.zeros(n_slots + 1, dtype=np.int64)
+    top_bit = 1
+    while top_bit * 2 <= n_slots:
+        top_bit *= 2
+    count = 0
+    for i in range(1, len(x)):
+        # La fenêtre de la date i est [i - window_size, i)
+        if slots[i - 1] >= 0:
+            _fenwick_add(tree, slots[i - 1], 1)
+            count += 1
+        if i - 1 - window_size >= 0 and slots[i - 1 - window_size] >= 0:
+            _fenwick_add(tree, slots[i - 1 - window_size], -1)
+            count -= 1
+        if i < window_size or count == 0:
+            continue
+        for q in range(len(fractions)):
+            position = fractions[q] * (count - 1)
+            low = int(np.floor(position))
+            high = min(low + 1, count - 1)
+            value_low = sorted_values[_fenwick_kth(tree, low, top_bit)]
+            value_high = sorted_values[_fenwick_kth(tree, high, top_bit)]
+            out[i, q] = value_low + (value_high - value_low) * (position - low)
+
+
+def rolling_quantiles(x, window_size, percentiles):
+    """
+    Quantiles glissants de plusieurs niveaux en une passe
+    :param x: série (T,) ou séries (T x P), valeurs manquantes ignorées
+    :param percentiles: niveaux en pourcentage, comme np.percentile
+    :return: tableau (T x Q) ou (T x P x Q), NaN avant window_size
+    """
+    x = np.asarray(x, dtype=np.float64)
+    fractions = np.asarray(percentiles, dtype=np.float64).ravel() / 100
+    columns = x[:, None] if x.ndim == 1 else x
+    out = np.full((columns.shape[0], columns.shape[1], len(fractions)), np.nan)
+    for j in range(columns.shape[1]):
+        column = np.ascontiguousarray(columns[:, j])
+        valid = ~np.isnan(column)
+        order = np.argsort(column, kind='stable')[:np.count_nonzero(valid)]
+        slots = np.full(len(column), -1, dtype=np.int64)
+        slots[order] = np.arange(len(order))
+        _rolling_quantiles(column, slots, column[order], window_size, fractions, out[:, j])
+    return out[:, 0] if x.ndim == 1 else out
@@ -0,0 +1,161 @@
+import numpy as np
+from scipy.optimize import minimize
+from scipy.special import gammaln
+from scipy.stats import norm, t, kendalltau
+
+# Bornes des paramètres, même paramétrisation que le package R copula
+BOUNDS = {
+    "Normal": [(-0.999, 0.999)],
+    "Student": [(-0.999, 0.999), (2.01, 100.0)],
+    "Plackett": [(1e-4, 1e4)],
+    "Clayton": [(1e-4, 100.0)],
+    "rotClayton": [(1e-4, 100.0)],
+    "Frank": [(-100.0, 100.0)],
+    "Gumbel": [(1.0, 100.0)],
+    "rotGumbel": [(1.0, 100.0)],
+}
+
+
+def normal_log_pdf(u, v, rho):
+    x = norm.ppf(u)
+    y = norm.ppf(v)
+    r2 = 1 - rho ** 2
+    return -0.5 * np.log(r2) - (rho ** 2 * (x ** 2 + y ** 2) - 2 * rho * x * y) / (2 * r2)
+
+
+def student_log_pdf(u, v, rho, df):
+    x = t.ppf(u, df)
+    y = t.ppf(v, df)
+    r2 = 1 - rho ** 2
+    return (gammaln((df + 2) / 2) + gammaln(df / 2) - 2 * gammaln((df + 1) / 2) - 0.5 * np.log(r2)
+            - (df + 2) / 2 * np.log1p((x ** 2 + y ** 2 - 2 * rho * x * y) / (df * r2))
+            + (df + 1) / 2 * (np.log1p(x ** 2 / df) + np.log1p(y ** 2 / df)))
+
+
+def plackett_log_pdf(u, v, theta):
+    eta = theta - 1
+    num = theta * (1 + eta * (u + v - 2 * u * v))
+    den = (1 + eta * (u + v)) ** 2 - 4 * theta * eta * u * v
+    return np.log(num) - 1.5 * np.log(den)
+
+
+def clayton_log_pdf(u, v, theta):
+    return (np.log1p(theta) - (1 + theta) * (np.log(u) + np.log(v))
+            - (2 + 1 / theta) * np.log(u ** (-theta) + v ** (-theta) - 1))
+
+
+def frank_log_pdf(u, v, theta):
+    if np.all(np.abs(theta) < 1e-8):
+        return np.zeros(np.broadcast(u, v).shape)
+    em = -np.expm1(-theta)
+    den = em - np.expm1(-theta * u) * np.expm1(-theta * v)
+    return np.log(theta * em) - theta * (u + v) - 2 * np.log(np.abs(den))
+
+
+def gumbel_log_pdf(u, v, theta):
+    x = -np.log(u)
+    y = -np.log(v)
+    s = x ** theta + y ** theta
+    a = s ** (1 / theta)
+    return (-a + x + y + (theta - 1) * (np.log(x) + np.log(y))
+            + (1 / theta - 2) * np.log(s) + np.log(a + theta - 1))
+
+
+def copula_log_pdf(copula_type, u, v, params):
+    """
+    log-densité de la copule copula_type évaluée terme à terme
+    """
+    if copula_type == "Student":
+        return student_log_pdf(u, v, params[0], params[1])
+    if copula_type == "Plackett":
+        return plackett_log_pdf(u, v, params[0])
+    if copula_type == "Clayton":
+        return clayton_log_pdf(u, v, params[0])
+    if copula_type == "rotClayton":
+        return clayton_log_pdf(1 - u, 1 - v, params[0])
+    if copula_type == "Frank":
+        return frank_log_pdf(u, v, params[0])
+    if copula_type == "Gumbel":
+        return gumbel_log_pdf(u, v, params[0])
+    if copula_type == "rotGumbel":
+        return gumbel_log_pdf(1 - u, 1 - v, params[0])
+    return normal_log_pdf(u, v, params[0])
+
+
+def copula_neg_log_likelihood(params, copula_type, u, v):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ll = copula_log_pdf(copula_type, u, v, params)
+    ll = np.where(np.isfinite(ll), ll, -1e10)
+    return -np.sum(ll)
+
+
+def starting_values(copula_type, u, v):
+    """
+    Valeurs de départ par inversion du tau de Kendall (comme fitCopula en R)
+    """
+    tau = kendalltau(u, v)[0]
+    if copula_type == "Student":
+        return [np.sin(np.pi * tau / 2), 5.0]
+    if copula_type in ("Clayton", "rotClayton"):
+        return [2 * max(tau, 1e-3) / (1 - max(tau, 1e-3))]
+    if copula_type in ("Gumbel", "rotGumbel"):
+        return [1 / (1 - max(tau, 0.0))]
+    if copula_type == "Frank":
+        return [9 * tau / (1 - abs(tau))]
+    if copula_type == "Plackett":
+        return [np.exp(4 * tau)]
+    return [np.sin(np.pi * tau / 2)]
+
+
+def fit_copula(residuals, copula_type="Normal", start=None):
+    """
+    Maximum de vraisemblance de la copule sur les résidus standardisés (T x 2).
+    Comme fit_copula.R, les pseudo-observations sont pnorm(résidus).
+    :param start: estimation de la fenêtre précédente pour un démarrage à chaud,
+                  sinon valeurs de départ par inversion du tau de Kendall
+    :return: dict avec estimate, logLik, AIC, BIC, nit
+    """
+    residuals = np.asarray(residuals, dtype=np.float64)
+    return fit_copula_uniforms(norm.cdf(residuals[:, 0]), norm.cdf(residuals[:, 1]), copula_type, start)
+
+
+def fit_copula_uniforms(u, v, copula_type="Normal", start=None):
+    """
+    Même estimation à partir des pseudo-observations u et v dans ]0, 1[ (ex. marginales MSM)
+    """
+    u = np.clip(np.ravel(np.asarray(u, dtype=np.float64)), 1e-12, 1 - 1e-12)
+    v = np.clip(np.ravel(np.asarray(v, dtype=np.float64)), 1e-12, 1 - 1e-12)
+    bounds = BOUNDS.get(copula_type, BOUNDS["Normal"])
+
+    if start is None:
+        start = starting_values(copula_type, u, v)
+    start = np.clip(np.atleast_1d(np.asarray(start, dtype=np.float64)),
+                    [b[0] for b in bounds], [b[1] for b in bounds])
+
+    result = minimize(copula_neg_log_likelihood, start, args=(copula_type, u, v),
+                      bounds=bounds, method='L-BFGS-B')
+
+    log_lik = -result.fun
+    n_params = len(result.x)
+    n_obs = len(u)
+    return {
+        "estimate": result.x,
+        "logLik": log_lik,
+        "AIC": -2 * log_lik + 2 * n_params,
+        "BIC": -2 * log_lik + np.log(n_obs) * n_params,
+        "nit": result.nit,
+    }
+
+
+def fit_copula_rolling(residual_windows, copula_type="Normal"):
+    """
+    Estimation sur une suite de fenêtres qui se chevauchent : chaque fenêtre
+    démarre de l'estimation de la précédente.
+    """
+    fits = []
+    start = None
+    for residuals in residual_windows:
+        fit = fit_copula(residuals, copula_type, start)
+        start = fit["estimate"]
+        fits.append(fit)
+    return fits
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Profil de log-vraisemblance des copules sur une grille de paramètres.
+
+La densité est évaluée en une seule fois sur (points de grille x observations) par
+broadcasting numpy : la meilleure cellule sert de point de départ à L-BFGS-B et le profil
+complet donne des intervalles de confiance par rapport de vraisemblance.
+La densité doit accepter des paramètres sous forme de tableaux :
+    - 1 paramètre : param de forme (G, 1)
+    - k paramètres : param de forme (k, G, 1), param[0] ... param[k-1] de forme (G, 1)
+ce qui est le cas des cdf de copulabus (via copula_pdf) et des densités de copula_mle
+(via family_density).
+"""
+import numpy as np
+from scipy.optimize import minimize
+from scipy.stats import chi2
+import copula_mle
+
+
+def make_grid(bounds, n_points=50):
+    """
+    Grille (G x k) sur des bornes finies ; échelle logarithmique pour les paramètres
+    positifs qui couvrent plusieurs ordres de grandeur
+    """
+    axes = []
+    for low, high in bounds:
+        if low > 0 and high / low > 100:
+            axes.append(np.geomspace(low, high, n_points))
+        else:
+            axes.append(np.linspace(low, high, n_points))
+    mesh = np.meshgrid(*axes, indexing='ij')
+    return np.column_stack([m.ravel() for m in mesh])
+
+
+def _broadcast_params(grid):
+    grid = np.atleast_2d(grid)
+    if grid.shape[1] == 1:
+        return grid[:, 0][:, None]
+    return grid.T[:, :, None]
+
+
+def profile_log_likelihood(copula_density, F1, F2, grid, f1=None, f2=None):
+    """
+    Log-vraisemblance pour chaque point de la grille (G x k), calculée en une opération (G x N)
+    :param f1, f2: densités marginales (optionnelles, ne dépendent pas du paramètre)
+    """
+    u = np.asarray(F1, dtype=np.float64).ravel()[None, :]
+    v = np.asarray(F2, dtype=np.float64).ravel()[None, :]
+    with np.errstate(all='ignore'):
+        c = copula_density(u, v, _broadcast_params(grid))
+        # densité non finie (instabilité numérique) traitée comme invalide, comme dans copula_mle
+        c = np.where(np.isfinite(c), c, 0.0)
+        ll = np.sum(np.log(np.fmax(c, 1e-20)), axis=-1)
+    if f1 is not None and f2 is not None:
+        ll = ll + np.sum(np.log(f1)) + np.sum(np.log(f2))
+    return ll
+
+
+def refine_grid(grid, profile, bounds, n_points=50):
+    """
+    Grille locale autour de la meilleure cellule (une maille de part et d'autre)
+    """
+    best = grid[np.nanargmax(profile)]
+    local_bounds = []
+    for j, (low, high) in enumerate(bounds):
+        values = np.unique(grid[:, j])
+        i = np.searchsorted(values, best[j])
+        local_bounds.append((max(values[max(i - 1, 0)], low), min(values[min(i + 1, len(values) - 1)], high)))
+    return make_grid(local_bounds, n_points)
+
+
+def optimize_from_profile(copula_density, f1, f2, F1, F2, bounds, n_points=50):
+    """
+    Evalue le profil sur la grille (puis sur une grille locale autour du meilleur point),
+    et affine par L-BFGS-B depuis la meilleure cellule.
+    :return: paramètre optimal, - log-vraisemblance minimale, (grille, profil) ; l'optimum
+             affiné est le dernier point du profil, dont il est le maximum
+    """
+    grid = make_grid(bounds, n_points)
+    profile = profile_log_likelihood(copula_density, F1, F2, grid, f1, f2)
+    local_grid = refine_grid(grid, profile, bounds, n_points)
+    grid = np.vstack((grid, local_grid))
+    profile = np.concatenate((profile, profile_log_likelihood(copula_density, F1, F2, local_grid, f1, f2)))
+    start = grid[np.nanargmax(profile)]
+
+    def objective(param):
+        return -profile_log_likelihood(copula_density, F1, F2, param[None, :], f1, f2)[0]
+
+    result = minimize(objective, start, bounds=bounds, method='L-BFGS-B')
+    grid = np.vstack((grid, result.x))
+    profile = np.append(profile, -result.fun)
+    return result.x, result.fun, (grid, profile)
+
+
+def profile_confidence_interval(grid, profile, level=0.95):
+    """
+    Intervalle de confiance de chaque paramètre par rapport de vraisemblance :
+    {theta : 2 * (max LL - LL profilée(theta)) <= chi2(1)}, la LL étant maximisée
+    sur les autres paramètres de la grille ; max LL est celle de l'optimum L-BFGS-B, ajouté
+    au profil par optimize_from_profile, et non celle de la meilleure cellule.
+    :return: liste de (borne basse, borne haute) pour chaque paramètre
+    """
+    grid = np.atleast_2d(grid)
+    threshold = np.nanmax(profile) - chi2.ppf(level, 1) / 2
+    intervals = []
+    for j in range(grid.shape[1]):
+        values = np.unique(grid[:, j])
+        profiled = np.array([np.nanmax(profile[grid[:, j] == x]) for x in values])
+        inside = values[profiled >= threshold]
+        intervals.append((inside.min(), inside.max()))
+    return intervals
+
+
+def family_density(copula_type):
+    """
+    Densité de copula_mle (paramétrisation du package R copula) au format du profil
+    """
+    n_params = len(copula_mle.BOUNDS[copula_type])
+
+    def density(u, v, param):
+        params = [param] if n_params == 1 else param
+        return np.exp(copula_mle.copula_log_pdf(copula_type, u, v, params))
+    return density
+
+
+def optimize_family(copula_type, f1, f2, F1, F2, n_points=50, level=0.95):
+    """
+    Profil puis L-BFGS-B sur les bornes copula_mle.BOUNDS de la famille
+    :return: paramètres optimaux, - log-vraisemblance minimale, intervalles de confiance
+    """
+    optimal_param, min_log_likelihood, (grid, profile) = optimize_from_profile(
+        family_density(copula_type), f1, f2, F1, F2, copula_mle.BOUNDS[copula_type], n_points)
+    return optimal_param, min_log_likelihood, profile_confidence_interval(grid, profile, level)
@@ -0,0 +1,101 @@
+import numpy as np
+from scipy.stats import norm, t
+
+# Familles disponibles dans fit_copula.R
+COPULA_TYPES = ["Normal", "Student", "Plackett", "Clayton", "rotClayton", "Frank", "Gumbel", "rotGumbel"]
+
+# Evite les quantiles infinis lors du retour en marges gaussiennes
+EPS = 1e-12
+
+
+def sample_normal(rho, n, rng):
+    z1 = rng.standard_normal(n)
+    z2 = rho * z1 + np.sqrt(1 - rho ** 2) * rng.standard_normal(n)
+    return np.column_stack((norm.cdf(z1), norm.cdf(z2)))
+
+
+def sample_student(rho, df, n, rng):
+    z1 = rng.standard_normal(n)
+    z2 = rho * z1 + np.sqrt(1 - rho ** 2) * rng.standard_normal(n)
+    # Mélange de variance commun aux deux composantes
+    w = np.sqrt(df / rng.chisquare(df, n))
+    return np.column_stack((t.cdf(z1 * w, df), t.cdf(z2 * w, df)))
+
+
+def sample_plackett(theta, n, rng):
+    # Inversion conditionnelle (Johnson, 1987) : v = C^-1(w | u) en forme fermée
+    u = rng.random(n)
+    w = rng.random(n)
+    if abs(theta - 1) < 1e-10:
+        return np.column_stack((u, w))
+    a = w * (1 - w)
+    b = theta + a * (theta - 1) ** 2
+    c = 2 * a * (u * theta ** 2 + 1 - u) + theta * (1 - 2 * a)
+    d = np.sqrt(theta) * np.sqrt(theta + 4 * a * u * (1 - u) * (1 - theta) ** 2)
+    v = (c - (1 - 2 * w) * d) / (2 * b)
+    return np.column_stack((u, v))
+
+
+def sample_clayton(theta, n, rng):
+    # Marshall-Olkin : frailty Gamma(1/theta) et transformée de Laplace (1+s)^(-1/theta)
+    if theta < 1e-10:
+        return rng.random((n, 2))
+    v = rng.gamma(1 / theta, 1.0, n)
+    e = rng.exponential(1.0, (n, 2))
+    return (1 + e / v[:, None]) ** (-1 / theta)
+
+
+def sample_frank(theta, n, rng):
+    # Inversion conditionnelle de C(v | u), valable pour theta de signe quelconque
+    u = rng.random(n)
+    w = rng.random(n)
+    if abs(theta) < 1e-10:
+        return np.column_stack((u, w))
+    v = -np.log1p(w * np.expm1(-theta) / (w + (1 - w) * np.exp(-theta * u))) / theta
+    return np.column_stack((u, v))
+
+
+def sample_gumbel(theta, n, rng):
+    # Marshall-Olkin : frailty stable positive (Chambers-Mallows-Stuck) d'indice 1/theta
+    alpha = 1 / theta
+    if abs(alpha - 1) < 1e-10:
+        return rng.random((n, 2))
+    phi = rng.uniform(0, np.pi, n)
+    w = rng.exponential(1.0, n)
+    v = (np.sin(alpha * phi) / np.sin(phi) ** (1 / alpha)
+         * (np.sin((1 - alpha) * phi) / w) ** ((1 - alpha) / alpha))
+    e = rng.exponential(1.0, (n, 2))
+    return np.exp(-(e / v[:, None]) ** alpha)
+
+
+def sample_copula(copula_type, params, n, rng):
+    """
+    Tirages (n x 2) dans la copule copula_type, paramétrée comme dans le package R copula.
+    :param params: scalaire ou séquence ([rho, df] pour la Student)
+    :param rng: np.random.Generator
+    """
+    params = np.atleast_1d(np.asarray(params, dtype=np.float64))
+    if copula_type == "Student":
+        return sample_student(params[0], params[1], n, rng)
+    if copula_type == "Plackett":
+        return sample_plackett(params[0], n, rng)
+    if copula_type == "Clayton":
+        return sample_clayton(params[0], n, rng)
+    if copula_type == "rotClayton":
+        return 1 - sample_clayton(params[0], n, rng)
+    if copula_type == "Frank":
+        return sample_frank(params[0], n, rng)
+    if copula_type == "Gumbel":
+        return sample_gumbel(params[0], n, rng)
+    if copula_type == "rotGumbel":
+        return 1 - sample_gumbel(params[0], n, rng)
+    # Copule normale par défaut, comme dans fit_copula.R
+    return sample_normal(params[0], n, rng)
+
+
+def simulate_copula_residuals(copula_type, params, n, rng):
+    """
+    Equivalent de rCopula + qnorm dans fit_copula.R : résidus simulés à marges gaussiennes
+    """
+    u = np.clip(sample_copula(copula_type, params, n, rng), EPS, 1 - EPS)
+    return norm.ppf(u)
@@ -8,6 +8,8 @@ Created on Thu May 16 20:09:34 2024
 import numpy as np
 import pandas as pd
 import Model_MSM as MSM
+import data_store
+import copula_profile
 from scipy.optimize import minimize
 import yfinance as yf
 
@@ -77,90 +79,94 @@ def optimize(copula_cdf, f1, f2, F1, F2, param, bounds):
     min_log_likelihood = result.fun
     return optimal_param, min_log_likelihood
 
+def optimize_profile(copula_cdf, f1, f2, F1, F2, bounds, n_points=50):
+    # Départ de L-BFGS-B depuis le meilleur point d'une grille évaluée en une fois
+    density = lambda u, v, param: copula_pdf(copula_cdf, u, v, param)
+    optimal_param, min_log_likelihood, (grid, profile) = copula_profile.optimize_from_profile(
+        density, f1, f2, F1, F2, bounds, n_points)
+    intervals = copula_profile.profile_confidence_interval(grid, profile)
+    return optimal_param, min_log_likelihood, intervals
+
 if __name__ == '__main__':
     
     
-    datas = pd.read_excel('SP500NASDAQ2.xls')  # Try Latin-1 if UTF-8 fails
-
-    df = pd.DataFrame(datas)
-    df['DATE'] = pd.to_datetime(df['DATE'])
-    df.set_index('DATE', inplace=True)
+    df = data_store.load_prices('SP500NASDAQ2.xls')
 
     k_compos = 5
     index = 'SP500'
-    result_sp500, fy_sp500, Fy_sp500, pmatsp500, m0sp500, sigmasp500 = MSM.proceed_MSM_density_and_marginals_calculation(df, index, k_compos)
+    result_sp500, fy_sp500, Fy_sp500, pmatsp500, m0sp500, sigmasp500 = MSM.cached_MSM_density_and_marginals_calculation(df, index, k_compos)
     index = 'NASDAQCOM'
-    result_nasdaq, fy_nasdaq, Fy_nasdaq, pmatnasdaq, m0nasdaq, sigmanasdaq = MSM.proceed_MSM_density_and_marginals_calculation(df, index, k_compos)
+    result_nasdaq, fy_nasdaq, Fy_nasdaq, pmatnasdaq, m0nasdaq, sigmanasdaq = MSM.cached_MSM_density_and_marginals_calculation(df, index, k_compos)
     N = len(fy_nasdaq)
     print('')
     
     # Plackett
     
-    param = 10
-    bounds = [(1e-20, np.inf)]
-    optimal_param, min_log_likelihood = optimize(plackett_cdf, fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq, param, bounds)
+    bounds = [(1e-3, 100)]
+    optimal_param, min_log_likelihood, intervals = optimize_profile(plackett_cdf, fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq, bounds)
     print("Plackett copula")
     print(f"Optimal parameter: {optimal_param}, Minimum log-likelihood: {-min_log_likelihood}")
+    print(f"95% profile likelihood interval: {intervals}")
     print(f"AIC: {AIC(1, -min_log_likelihood)}, BIC: {BIC(1, -min_log_likelihood, N)}")
     print('')
     
     # Clayton
     
-    param = 5
-    bounds = [(1e-20, np.inf)]
-    optimal_param, min_log_likelihood = optimize(clayton_cdf, fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq, param, bounds)
+    bounds = [(1e-3, 30)]
+    optimal_param, min_log_likelihood, intervals = optimize_profile(clayton_cdf, fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq, bounds)
     print("Clayton copula")
     print(f"Optimal parameter: {optimal_param}, Minimum log-likelihood: {-min_log_likelihood}")
+    print(f"95% profile likelihood interval: {intervals}")
     print(f"AIC: {AIC(1, -min_log_likelihood)}, BIC: {BIC(1, -min_log_likelihood, N)}")
     print('')
     
     # Rotated Clayton
     
-    param = 5
-    bounds = [(1e-20, np.inf)]
-    optimal_param, min_log_likelihood = optimize(rotated_clayton_cdf, fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq, param, bounds)
+    bounds = [(1e-3, 30)]
+    optimal_param, min_log_likelihood, intervals = optimize_profile(rotated_clayton_cdf, fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq, bounds)
     print("Rotated Clayton copula")
     print(f"Optimal parameter: {optimal_param}, Minimum log-likelihood: {-min_log_likelihood}")
+    print(f"95% profile likelihood interval: {intervals}")
     print(f"AIC: {AIC(1, -min_log_likelihood)}, BIC: {BIC(1, -min_log_likelihood, N)}")
     print('')
     
     # SJC
     
-    param = [0.5, 0.5]
-    bounds = [(1e-20, 0.99), (1e-20, 0.99)]
-    optimal_param, min_log_likelihood = optimize(sjc_cdf, fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq, param, bounds)
+    bounds = [(1e-3, 0.99), (1e-3, 0.99)]
+    optimal_param, min_log_likelihood, intervals = optimize_profile(sjc_cdf, fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq, bounds, n_points=30)
     print("SJC copula")
     print(f"Optimal parameter: {optimal_param}, Minimum log-likelihood: {-min_log_likelihood}")
+    print(f"95% profile likelihood interval: {intervals}")
     print(f"AIC: {AIC(2, -min_log_likelihood)}, BIC: {BIC(2, -min_log_likelihood, N)}")
     print('')
     
     # Frank
     
-    param = 20
-    bounds = [(1e-20, np.inf)]
-    optimal_param, min_log_likelihood = optimize(frank_cdf, fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq, param, bounds)
+    bounds = [(1e-3, 50)]
+    optimal_param, min_log_likelihood, intervals = optimize_profile(frank_cdf, fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq, bounds)
     print("Frank copula")
     print(f"Optimal parameter: {optimal_param}, Minimum log-likelihood: {-min_log_likelihood}")
+    print(f"95% profile likelihood interval: {intervals}")
     print(f"AIC: {AIC(1, -min_log_likelihood)}, BIC: {BIC(1, -min_log_likelihood, N)}")
     print('')
     
     # Gumbel
     
-    param = 5
-    bounds = [(1+1e-20, np.inf)]
-    optimal_param, min_log_likelihood = optimize(gumbel_cdf, fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq, param, bounds)
+    bounds = [(1 + 1e-6, 20)]
+    optimal_param, min_log_likelihood, intervals = optimize_profile(gumbel_cdf, fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq, bounds)
     print("Gumbel copula")
     print(f"Optimal parameter: {optimal_param}, Minimum log-likelihood: {-min_log_likelihood}")
+    print(f"95% profile likelihood interval: {intervals}")
     print(f"AIC: {AIC(1, -min_log_likelihood)}, BIC: {BIC(1, -min_log_likelihood, N)}")
     print('')
     
     # Rotated Gumbel
     
-    param = 5
-    bounds = [(1+1e-20, np.inf)]
-    optimal_param, min_log_likelihood = optimize(rotated_gumbel_cdf, fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq, param, bounds)
+    bounds = [(1 + 1e-6, 20)]
+    optimal_param, min_log_likelihood, intervals = optimize_profile(rotated_gumbel_cdf, fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq, bounds)
     print("Rotated Gumbel copula")
     print(f"Optimal parameter: {optimal_param}, Minimum log-likelihood: {-min_log_likelihood}")
+    print(f"95% profile likelihood interval: {intervals}")
     print(f"AIC: {AIC(1, -min_log_likelihood)}, BIC: {BIC(1, -min_log_likelihood, N)}")
     print('')
     
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+Couche de données : les fichiers bruts (csv / xls / xlsx) ne sont lus qu'une fois, convertis
+(dates triées, valeurs numériques, "." et autres valeurs invalides en NaN, comme les to_numeric
+de chaque script) et mis en cache au format .npy à côté de datas/. Les colonnes restent alignées
+sur toutes les dates : chaque script nettoie sa colonne comme avant (Model_MSM.data_from_df),
+complete=True ne garde que les dates où toutes les colonnes sont connues (generate_var, backtests).
+Le cache est invalidé quand le fichier source change (mtime et taille, puis empreinte sha256) ;
+les lectures suivantes sont des memory-maps, sans copie.
+
+ResultsStore conserve les séries de VaR en ajout seul : une date déjà présente n'est jamais réécrite.
+ModelStore conserve les modèles estimés (tableaux .npy) sous une clé calculée sur les données et les
+réglages de l'estimation.
+"""
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(ROOT_DIR, 'datas')
+CACHE_DIR = os.path.join(DATA_DIR, 'cache')
+RESULTS_DIR = os.path.join(DATA_DIR, 'results')
+MODELS_DIR = os.path.join(CACHE_DIR, 'models')
+# Format du cache des prix : une entrée d'une autre version est recalculée
+CACHE_VERSION = 2
+
+
+def _file_hash(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _read_raw(path):
+    if path.lower().endswith('.csv'):
+        return pd.read_csv(path)
+    return pd.read_excel(path)
+
+
+def _resolve(source):
+    """
+    Chemin tel quel, sinon le même nom dans datas/ puis à la racine du dépôt (SP500NASDAQ2.xls)
+    """
+    if os.path.exists(source):
+        return os.path.abspath(source)
+    for directory in (DATA_DIR, ROOT_DIR):
+        path = os.path.join(directory, os.path.basename(source))
+        if os.path.exists(path):
+            return path
+    return os.path.join(DATA_DIR, os.path.basename(source))
+
+
+def _cache_path(path):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    extension = os.path.splitext(path)[1].lstrip('.').lower()
+    return os.path.join(CACHE_DIR, f'{stem}_{extension}')
+
+
+def ingest(source, date_column=None):
+    """
+    Lit le fichier brut, le convertit et écrit le cache (dates.npy, values.npy, meta.json) ;
+    seules les lignes sans date valide sont retirées, une valeur manquante reste NaN
+    :param date_column: colonne des dates (la première par défaut)
+    """
+    path = _resolve(source)
+    raw = _read_raw(path)
+    date_column = raw.columns[0] if date_column is None else date_column
+    dates = pd.to_datetime(raw[date_column], errors='coerce')
+    values = raw.drop(columns=date_column).apply(pd.to_numeric, errors='coerce')
+    keep = dates.notna().to_numpy()
+    order = np.argsort(dates[keep].to_numpy(), kind='stable')
+
+    directory = _cache_path(path)
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, 'dates.npy'), dates[keep].to_numpy()[order])
+    np.save(os.path.join(directory, 'values.npy'), np.ascontiguousarray(values[keep].to_numpy(dtype=np.float64)[order]))
+    stat = os.stat(path)
+    meta = {'version': CACHE_VERSION, 'source': path, 'mtime': stat.st_mtime, 'size': stat.st_size, 'sha256': _file_hash(path),
+            'date_column': str(date_column), 'columns': [str(c) for c in values.columns]}
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    return meta
+
+
+def _valid_meta(path):
+    meta_path = os.path.join(_cache_path(path), 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta.get('version') != CACHE_VERSION:
+        return None
+    stat = os.stat(path)
+    if meta['mtime'] == stat.st_mtime and meta['size'] == stat.st_size:
+        return meta
+    # mtime modifié (copie, checkout...) : le cache reste valable si le contenu est identique
+    if meta['size'] == stat.st_size and meta['sha256'] == _file_hash(path):
+        meta['mtime'] = stat.st_mtime
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f)
+        return meta
+    return None
+
+
+def _load_cache(source, date_column=None):
+    path = _resolve(source)
+    meta = _valid_meta(path)
+    if meta is None:
+        meta = ingest(path, date_column)
+    directory = _cache_path(path)
+    dates = np.load(os.path.join(directory, 'dates.npy'), mmap_mode='r')
+    values = np.load(os.path.join(directory, 'values.npy'), mmap_mode='r')
+    return dates, values, meta
+
+
+def _complete_rows(dates, values):
+    keep = ~np.isnan(values).any(axis=1)
+    return dates[keep], values[keep]
+
+
+def load_price_arrays(source, date_column=None, complete=False):
+    """
+    :param complete: ne garder que les dates où toutes les colonnes sont connues (copie)
+    :return: dates (T,) datetime64, valeurs (T x K) en memory-map (NaN si manquantes), noms des colonnes
+    """
+    dates, values, meta = _load_cache(source, date_column)
+    if complete:
+        dates, values = _complete_rows(dates, values)
+    return dates, values, meta['columns']
+
+
+def load_prices(source, date_column=None, complete=False):
+    """
+    DataFrame des prix indexé par date (nommée comme dans le fichier), sur les tableaux du cache ;
+    les valeurs manquantes restent NaN, chaque colonne se nettoie séparément
+    :param complete: ne garder que les dates où toutes les colonnes sont connues (rendements de portefeuille)
+    """
+    dates, values, meta = _load_cache(source, date_column)
+    if complete:
+        dates, values = _complete_rows(dates, values)
+    index = pd.DatetimeIndex(dates, name=meta['date_column'])
+    return pd.DataFrame(values, index=index, columns=meta['columns'], copy=False)
+
+
+class ResultsStore:
+    """
+    Séries de résultats (VaR...) en ajout seul : dates.i8 et values.f8 par série, lus en memory-map
+    """
+    def __init__(self, directory=RESULTS_DIR):
+        self.directory = directory
+
+    def _paths(self, name):
+        directory = os.path.join(self.directory, name)
+        return directory, os.path.join(directory, 'dates.i8'), os.path.join(directory, 'values.f8')
+
+    def names(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(os.listdir(self.directory))
+
+    def append(self, name, dates, values):
+        """
+        Ajoute les dates postérieures à la dernière date stockée, ignore les autres
+        :return: nombre de lignes ajoutées
+        """
+        directory, dates_path, values_path = self._paths(name)
+        os.makedirs(directory, exist_ok=True)
+        dates = np.asarray(pd.to_datetime(np.atleast_1d(dates)).to_numpy(), dtype='datetime64[ns]').astype(np.int64)
+        values = np.atleast_1d(np.asarray(values, dtype=np.float64))
+        stored_dates, _ = self.read(name)
+        if len(stored_dates):
+            new = dates > stored_dates[-1].astype(np.int64)
+            dates, values = dates[new], values[new]
+        if np.any(np.diff(dates) <= 0):
+            raise ValueError(f"Dates non croissantes pour la série {name}")
+        with open(dates_path, 'ab') as f:
+            dates.tofile(f)
+        with open(values_path, 'ab') as f:
+            values.tofile(f)
+        return len(dates)
+
+    def read(self, name):
+        """
+        :return: dates (datetime64[ns]) et valeurs en memory-map
+        """
+        _, dates_path, values_path = self._paths(name)
+        if not os.path.exists(dates_path) or os.path.getsize(dates_path) == 0:
+            return np.empty(0, dtype='datetime64[ns]'), np.empty(0)
+        dates = np.memmap(dates_path, dtype=np.int64, mode='r').view('datetime64[ns]')
+        values = np.memmap(values_path, dtype=np.float64, mode='r')
+        return dates, values
+
+    def to_frame(self, names=None):
+        names = self.names() if names is None else names
+        series = {}
+        for name in names:
+            dates, values = self.read(name)
+            series[name] = pd.Series(values, index=pd.DatetimeIndex(dates))
+        return pd.DataFrame(series)
+
+
+def _key_part(value):
+    # les tableaux entrent dans la clé par leur empreinte, le reste tel quel
+    if isinstance(value, np.ndarray):
+        array = np.ascontiguousarray(value)
+        return {'dtype': str(array.dtype), 'shape': array.shape, 'sha256': hashlib.sha256(array.tobytes()).hexdigest()}
+    if isinstance(value, (list, tuple)):
+        return [_key_part(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _key_part(v) for k, v in value.items()}
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class ModelStore:
+    """
+    Modèles estimés : un dossier par clé, un .npy par tableau, relus en memory-map
+    """
+    def __init__(self, directory=MODELS_DIR):
+        self.directory = directory
+
+    @staticmethod
+    def key(**settings):
+        """
+        Empreinte des données et réglages de l'estimation (tableaux compris)
+        """
+        text = json.dumps(_key_part(settings), sort_keys=True)
+        return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+    def load(self, key, mmap_mode='r'):
+        """
+        :return: dictionnaire des tableaux, None si la clé est absente
+        """
+        directory = os.path.join(self.directory, key)
+        if not os.path.exists(os.path.join(directory, 'names.json')):
+            return None
+        with open(os.path.join(directory, 'names.json')) as f:
+            names = json.load(f)
+        return {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode) for name in names}
+
+    def save(self, key, arrays):
+        """
+        Écrit les tableaux dans un dossier temporaire renommé à la fin : une estimation interrompue
+        ne laisse pas d'entrée partielle
+        :return: les tableaux relus en memory-map
+        """
+        directory = os.path.join(self.directory, key)
+        temporary = f'{directory}.{os.getpid()}.tmp'
+        os.makedirs(temporary, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(temporary, f'{name}.npy'), np.asarray(array))
+        with open(os.path.join(temporary, 'names.json'), 'w') as f:
+            json.dump(list(arrays), f)
+        try:
+            os.replace(temporary, directory)
+        except OSError:
+            # un autre processus a écrit la même clé entre-temps : son entrée est gardée
+            if not os.path.isdir(directory):
+                raise
+            shutil.rmtree(temporary)
+        return self.load(key)
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+Copules dynamiques à la Patton (2006) : SJC et gaussienne à paramètres variant dans le temps.
+
+Les paramètres de dépendance suivent une récursion de type ARMA :
+    tau_t = Lambda(omega + beta * tau_{t-1} + alpha * 1/10 * sum_{j=1..10} |u_{t-j} - v_{t-j}|)
+pour la SJC (une équation par queue, Lambda logistique) et
+    rho_t = Lambda~(omega + beta * rho_{t-1} + alpha * 1/10 * sum_{j=1..10} x_{t-j} * y_{t-j})
+pour la gaussienne (Lambda~ logistique modifiée à valeurs dans ]-1, 1[).
+La récursion et la log-vraisemblance sont calculées dans un seul noyau numba.
+"""
+import numpy as np
+import pandas as pd
+from numba import jit
+from scipy.optimize import minimize
+from scipy.stats import norm, rankdata
+import Model_MSM as MSM
+import data_store
+
+# Nombre de retards utilisés dans la variable de forçage de Patton
+N_LAGS = 10
+# Bornes de sécurité pour les coefficients de dépendance de queue
+TAU_MIN = 1e-4
+TAU_MAX = 1 - 1e-4
+
+
+@jit(nopython=True)
+def _logistic(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+@jit(nopython=True)
+def _modified_logistic(x):
+    return (1.0 - np.exp(-x)) / (1.0 + np.exp(-x))
+
+
+@jit(nopython=True)
+def _log1mexp(x):
+    """
+    log(1 - exp(x)) pour x < 0, précis aux deux extrémités
+    """
+    if x < -0.6931471805599453:
+        return np.log1p(-np.exp(x))
+    return np.log(-np.expm1(x))
+
+
+@jit(nopython=True)
+def _joe_clayton_log_pdf(u, v, tau_up, tau_low):
+    """
+    log-densité de la copule de Joe-Clayton (dérivée croisée analytique de la cdf)
+    Calculée en log avec log1p/expm1 pour rester stable quand tau_up est proche de 1.
+    """
+    k = 1.0 / np.log2(2.0 - tau_up)
+    g = -1.0 / np.log2(tau_low)
+    # a = 1 - (1-u)^k et a_u = k(1-u)^(k-1), idem pour v
+    log_a = _log1mexp(k * np.log1p(-u))
+    log_b = _log1mexp(k * np.log1p(-v))
+    log_a_u = np.log(k) + (k - 1.0) * np.log1p(-u)
+    log_b_v = np.log(k) + (k - 1.0) * np.log1p(-v)
+    # s = a^-g + b^-g - 1 et G = s^(-1/g)
+    log_s = np.log1p(np.expm1(-g * log_a) + np.expm1(-g * log_b))
+    G = np.exp(-log_s / g)
+    one_minus_G = max(-np.expm1(-log_s / g), 1e-300)
+    # Terme commun aux dérivées G_u * G_v et G_uv
+    common = (-g - 1.0) * (log_a + log_b) + log_a_u + log_b_v + (-1.0 / g - 2.0) * log_s
+    bracket = (1.0 - 1.0 / k) * G + one_minus_G * (1.0 + g)
+    log_c = -np.log(k) + (1.0 / k - 2.0) * np.log(one_minus_G) + common + np.log(max(bracket, 1e-300))
+    if np.isfinite(log_c):
+        return log_c
+    return np.log(1e-300)
+
+
+@jit(nopython=True)
+def sjc_log_pdf(u, v, tau_up, tau_low):
+    """
+    log-densité de la copule de Joe-Clayton symétrisée (SJC)
+    """
+    c1 = np.exp(_joe_clayton_log_pdf(u, v, tau_up, tau_low))
+    c2 = np.exp(_joe_clayton_log_pdf(1.0 - u, 1.0 - v, tau_low, tau_up))
+    return np.log(max(0.5 * (c1 + c2), 1e-300))
+
+
+@jit(nopython=True)
+def sjc_tv_filter(params, u, v, tau_init):
+    """
+    Noyau compilé de la SJC dynamique.
+    :param params: [omega_U, alpha_U, beta_U, omega_L, alpha_L, beta_L]
+    :param u, v: pseudo-observations dans ]0, 1[
+    :param tau_init: [tau_U_0, tau_L_0] valeurs de départ de la récursion
+    :return: - log-vraisemblance, chemins tau_U et tau_L
+    """
+    T = len(u)
+    tau_up = np.empty(T)
+    tau_low = np.empty(T)
+    # Somme glissante des |u - v| sur les N_LAGS dernières dates
+    abs_diff = np.abs(u - v)
+    forcing_sum = 0.0
+    prev_up = tau_init[0]
+    prev_low = tau_init[1]
+    nll = 0.0
+
+    for t in range(T):
+        if t == 0:
+            tau_up[t] = prev_up
+            tau_low[t] = prev_low
+        else:
+            forcing_sum += abs_diff[t - 1]
+            if t > N_LAGS:
+                forcing_sum -= abs_diff[t - 1 - N_LAGS]
+            forcing = forcing_sum / min(t, N_LAGS)
+            tau_up[t] = _logistic(params[0] + params[2] * prev_up + params[1] * forcing)
+            tau_low[t] = _logistic(params[3] + params[5] * prev_low + params[4] * forcing)
+
+        tau_up[t] = min(max(tau_up[t], TAU_MIN), TAU_MAX)
+        tau_low[t] = min(max(tau_low[t], TAU_MIN), TAU_MAX)
+        prev_up = tau_up[t]
+        prev_low = tau_low[t]
+
+        nll -= sjc_log_pdf(u[t], v[t], tau_up[t], tau_low[t])
+
+    return nll, tau_up, tau_low
+
+
+@jit(nopython=True)
+def gaussian_tv_filter(params, x, y, rho_init):
+    """
+    Noyau compilé de la copule gaussienne dynamique.
+    :param params: [omega, alpha, beta]
+    :param x, y: quantiles gaussiens des pseudo-observations (norm.ppf(u), norm.ppf(v))
+    :param rho_init: valeur de départ de la récursion
+    :return: - log-vraisemblance, chemin de rho
+    """
+    T = len(x)
+    rho = np.empty(T)
+    cross = x * y
+    forcing_sum = 0.0
+    prev = rho_init
+    nll = 0.0
+
+    for t in range(T):
+        if t == 0:
+            rho[t] = prev
+        else:
+            forcing_sum += cross[t - 1]
+            if t > N_LAGS:
+                forcing_sum -= cross[t - 1 - N_LAGS]
+            forcing = forcing_sum / min(t, N_LAGS)
+            rho[t] = _modified_logistic(params[0] + params[2] * prev + params[1] * forcing)
+
+        rho[t] = min(max(rho[t], -0.9999), 0.9999)
+        prev = rho[t]
+
+        r2 = 1.0 - rho[t] ** 2
+        nll += 0.5 * np.log(r2) + (rho[t] ** 2 * (x[t] ** 2 + y[t] ** 2) - 2.0 * rho[t] * x[t] * y[t]) / (2.0 * r2)
+
+    return nll, rho
+
+
+def dynamic_sjc_log_likelihood(params, u, v, tau_init):
+    nll, _, _ = sjc_tv_filter(np.asarray(params, dtype=np.float64), u, v, tau_init)
+    return nll
+
+
+def dynamic_gaussian_log_likelihood(params, x, y, rho_init):
+    nll, _ = gaussian_tv_filter(np.asarray(params, dtype=np.float64), x, y, rho_init)
+    return nll
+
+
+def optimize_dynamic_sjc_params(u, v, initial_params, bounds, tau_init=(0.1, 0.1)):
+    """
+    Estimation de la SJC dynamique par maximum de vraisemblance.
+    :return: paramètres optimaux, - log-vraisemblance minimale, chemins tau_L et tau_U
+    """
+    u = np.ascontiguousarray(u, dtype=np.float64).ravel()
+    v = np.ascontiguousarray(v, dtype=np.float64).ravel()
+    tau_init = np.asarray(tau_init, dtype=np.float64)
+    result = minimize(dynamic_sjc_log_likelihood, initial_params, args=(u, v, tau_init),
+                      bounds=bounds, method='L-BFGS-B')
+    optimal_params = result.x
+    min_log_likelihood, tau_up, tau_low = sjc_tv_filter(optimal_params, u, v, tau_init)
+    return optimal_params, min_log_likelihood, tau_low, tau_up
+
+
+def optimize_dynamic_gaussian_params(u, v, initial_params, bounds, rho_init=0.5):
+    """
+    Estimation de la copule gaussienne dynamique par maximum de vraisemblance.
+    :return: paramètres optimaux, - log-vraisemblance minimale, chemin de rho
+    """
+    x = norm.ppf(np.ascontiguousarray(u, dtype=np.float64).ravel())
+    y = norm.ppf(np.ascontiguousarray(v, dtype=np.float64).ravel())
+    result = minimize(dynamic_gaussian_log_likelihood, initial_params, args=(x, y, rho_init),
+                      bounds=bounds, method='L-BFGS-B')
+    optimal_params = result.x
+    min_log_likelihood, rho = gaussian_tv_filter(optimal_params, x, y, rho_init)
+    return optimal_params, min_log_likelihood, rho
+
+
+if __name__ == '__main__':
+    df = data_store.load_prices('SP500NASDAQ2.xls')
+
+    k_compos = 5
+    index = 'SP500'
+    result_sp500, fy_sp500, Fy_sp500, pmatsp500, m0sp500, sigmasp500 = MSM.cached_MSM_density_and_marginals_calculation(df, index, k_compos)
+    index = 'NASDAQCOM'
+    result_nasdaq, fy_nasdaq, Fy_nasdaq, pmatnasdaq, m0nasdaq, sigmanasdaq = MSM.cached_MSM_density_and_marginals_calculation(df, index, k_compos)
+
+    # Pseudo-observations
+    u = rankdata(Fy_sp500) / (len(Fy_sp500) + 1)
+    v = rankdata(Fy_nasdaq) / (len(Fy_nasdaq) + 1)
+    dates = df.index[-len(u):]
+
+    # SJC dynamique : [omega_U, alpha_U, beta_U, omega_L, alpha_L, beta_L]
+    initial_params = [-1.0, -2.0, 1.0, -1.0, -2.0, 1.0]
+    bounds = [(-10, 10), (-25, 25), (-10, 10), (-10, 10), (-25, 25), (-10, 10)]
+    params_sjc, ll_sjc, tau_low, tau_up = optimize_dynamic_sjc_params(u, v, initial_params, bounds)
+    print(f"SJC dynamique : params={params_sjc}, log-likelihood: {-ll_sjc}")
+
+    # Gaussienne dynamique : [omega, alpha, beta]
+    initial_params = [0.5, 0.1, 1.0]
+    bounds = [(-10, 10), (-10, 10), (-10, 10)]
+    params_gauss, ll_gauss, rho = optimize_dynamic_gaussian_params(u, v, initial_params, bounds)
+    print(f"Gaussienne dynamique : params={params_gauss}, log-likelihood: {-ll_gauss}")
+
+    tail_dependence = pd.DataFrame({'tau_lower': tau_low, 'tau_upper': tau_up, 'rho': rho}, index=dates)
+    print(tail_dependence)
@@ -4,6 +4,8 @@ import numpy as np
 from copulas.bivariate import Frank
 from scipy.optimize import minimize
 import Model_MSM as MSM
+import copula_profile
+import data_store
 import pandas as pd
 
 def frank_copula_log_likelihood(theta, f1, f2, F1, F2):
@@ -20,35 +22,21 @@ def frank_copula_log_likelihood(theta, f1, f2, F1, F2):
         print("ll : ", ll)
     return ll/10
 
-# Définir la routine d'optimisation
-def optimize_theta(fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq, initial_theta, bounds):
-    # Minimise la log-vraisemblance négative pour trouver le theta optimal
-    result = minimize(frank_copula_log_likelihood, initial_theta, args=(fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq),
-                      bounds=[bounds], method='L-BFGS-B')
-    
-    # Valeur optimale de theta
-    optimal_theta = 2*result.x[0]
-    
-    # Valeur minimale de la log-vraisemblance
-    min_log_likelihood = result.fun
-    
-    return optimal_theta, min_log_likelihood
+def optimize_theta(fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq, n_points=50):
+    # Profil de vraisemblance évalué en une fois sur les bornes de copula_mle, puis L-BFGS-B
+    # depuis la meilleure cellule (densité de copula_mle, paramétrisation du package R copula)
+    optimal_param, min_log_likelihood, intervals = copula_profile.optimize_family(
+        "Frank", fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq, n_points)
+    return optimal_param[0], min_log_likelihood, intervals[0]
 
 if __name__ == '__main__':
-    datas = pd.read_excel('SP500NASDAQ2.xls')  # Try Latin-1 if UTF-8 fails
-
-    df = pd.DataFrame(datas)
-    df['DATE'] = pd.to_datetime(df['DATE'])
-    df.set_index('DATE', inplace=True)
+    df = data_store.load_prices('SP500NASDAQ2.xls')
 
     k_compos = 5
     index = 'SP500'
-    result_sp500, fy_sp500, Fy_sp500, pmatsp500, m0sp500, sigmasp500 = MSM.proceed_MSM_density_and_marginals_calculation(df, index, k_compos)
+    result_sp500, fy_sp500, Fy_sp500, pmatsp500, m0sp500, sigmasp500 = MSM.cached_MSM_density_and_marginals_calculation(df, index, k_compos)
     index = 'NASDAQCOM'
-    result_nasdaq, fy_nasdaq, Fy_nasdaq, pmatnasdaq, m0nasdaq, sigmanasdaq = MSM.proceed_MSM_density_and_marginals_calculation(df, index, k_compos)
-
-    initial_theta = 5.0  # Valeur initiale pour theta
-    bounds = (-np.inf, np.inf)  # Bornes pour theta
+    result_nasdaq, fy_nasdaq, Fy_nasdaq, pmatnasdaq, m0nasdaq, sigmanasdaq = MSM.cached_MSM_density_and_marginals_calculation(df, index, k_compos)
 
-    optimal_theta, min_log_likelihood = optimize_theta(fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq, initial_theta, bounds)
-    print(f"Optimal theta: {optimal_theta}, Minimum log-likelihood: {-min_log_likelihood}")
+    optimal_theta, min_log_likelihood, interval = optimize_theta(fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq)
+    print(f"Optimal theta: {optimal_theta}, Minimum log-likelihood: {-min_log_likelihood}, IC 95%: {interval}")
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Noyau compilé du GARCH(1,1) : log-vraisemblance, score analytique et estimation.
+Sans dépendance à R ni à matplotlib, il peut être importé par les processus du backtest parallèle.
+"""
+import numpy as np
+from numba import jit
+from scipy.optimize import minimize
+
+GARCH_BOUNDS = [(1e-8, None), (1e-8, 0.9999), (1e-8, 0.9999)]
+
+
+@jit(nopython=True)
+def garch_likelihood(theta, returns, var_incondi):
+    """
+    Noyau compilé du GARCH(1,1) (mêmes conventions que Garch.model : e_0 = 0, var_0 = var_incondi,
+    variances négatives ou nulles remplacées par la plus petite variance positive).
+    :return: - log-vraisemblance, gradient analytique en (mu, alpha, beta), chemin des variances
+    """
+    mu, alpha, beta = theta[0], theta[1], theta[2]
+    w = (1 - alpha - beta) * var_incondi
+    T = len(returns)
+    var_condi = np.empty(T + 1)
+    # Dérivées de var_condi par rapport à mu, alpha et beta
+    dvar = np.zeros((T + 1, 3))
+    var_condi[0] = var_incondi
+    var_min = var_incondi if var_incondi > 0 else np.inf
+    e_prev = 0.0
+    de_prev = 0.0
+    for i in range(1, T + 1):
+        var_condi[i] = w + alpha * e_prev + beta * var_condi[i - 1]
+        dvar[i, 0] = alpha * de_prev + beta * dvar[i - 1, 0]
+        dvar[i, 1] = -var_incondi + e_prev + beta * dvar[i - 1, 1]
+        dvar[i, 2] = -var_incondi + var_condi[i - 1] + beta * dvar[i - 1, 2]
+        if 0 < var_condi[i] < var_min:
+            var_min = var_condi[i]
+        e_prev = (returns[i - 1] - mu) ** 2
+        de_prev = -2 * (returns[i - 1] - mu)
+
+    nll = 0.0
+    grad = np.zeros(3)
+    for i in range(1, T + 1):
+        e = (returns[i - 1] - mu) ** 2
+        if var_condi[i] > 0:
+            var = var_condi[i]
+            d_var = 0.5 * (1 / var - e / var ** 2)
+            grad[0] += d_var * dvar[i, 0]
+            grad[1] += d_var * dvar[i, 1]
+            grad[2] += d_var * dvar[i, 2]
+        else:
+            # Variance plancher : ne dépend plus des paramètres
+            var = var_min
+        grad[0] += -(returns[i - 1] - mu) / var
+        nll += 0.5 * np.log(2 * np.pi) + 0.5 * np.log(var) + 0.5 * e / var
+    return nll, grad, var_condi
+
+
+def optimize_garch(returns, var_incondi, theta):
+    """
+    Estimation du GARCH(1,1) avec le gradient analytique du noyau compilé
+    :return: paramètres optimaux, - log-vraisemblance minimale, chemin des variances
+    """
+    returns = np.ascontiguousarray(returns, dtype=np.float64)
+
+    def objective(params):
+        nll, grad, _ = garch_likelihood(params, returns, var_incondi)
+        return nll, grad
+
+    result = minimize(objective, np.asarray(theta, dtype=np.float64), jac=True, bounds=GARCH_BOUNDS, tol=1e-8)
+    _, _, var_condi = garch_likelihood(result.x, returns, var_incondi)
+    return result.x, result.fun, var_condi
+
+
+def variance_term_structure(theta, var_incondi, last_return, last_var, H):
+    """
+    Prévisions de variance à h = 1..H par les formes fermées de la série géométrique :
+        var_{T+1} = w + alpha * e_T + beta * var_T
+        var_{T+h} = w * (1 - p^(h-1)) / (1 - p) + p^(h-1) * var_{T+1},  p = alpha + beta
+    Tous les arguments sont diffusés (actifs, fenêtres glissantes...) : theta de forme (..., 3).
+    :return: variances (..., H) et variance cumulée sur H jours (...)
+    """
+    theta = np.asarray(theta, dtype=np.float64)
+    mu, alpha, beta = theta[..., 0], theta[..., 1], theta[..., 2]
+    persistence = alpha + beta
+    w = (1 - persistence) * var_incondi
+    var_next = w + alpha * (np.asarray(last_return) - mu) ** 2 + beta * np.asarray(last_var)
+    # Limite p -> 1 : w / (1 - p) * (1 - p^k) -> w * k
+    gap = 1 - persistence
+    regular = np.abs(gap) > 1e-12
+    long_run = np.where(regular, w / np.where(regular, gap, 1), 0)
+    powers = persistence[..., None] ** np.arange(H)
+    variances = np.where(regular[..., None],
+                         long_run[..., None] * (1 - powers),
+                         w[..., None] * np.arange(H)) + powers * var_next[..., None]
+    # Somme des p^k pour k < H
+    geometric_sum = np.where(regular, (1 - persistence ** H) / np.where(regular, gap, 1), H)
+    cumulative = np.where(regular, long_run * (H - geometric_sum), w * H * (H - 1) / 2) + geometric_sum * var_next
+    return variances, cumulative
@@ -1,27 +1,18 @@
 
 from scipy.optimize import minimize
-import rpy2.robjects as robjects
-from rpy2.robjects import pandas2ri
-from rpy2.rinterface_lib import callbacks
 from tqdm import tqdm
 import pandas as pd
 import numpy as np
-import matplotlib
 import matplotlib.pyplot as plt
-matplotlib.use("Qt5Agg")
-pandas2ri.activate()
 import os
+import copula_mle
+import copula_sampler
+from garch_kernel import garch_likelihood, optimize_garch, variance_term_structure
+import rolling_backtest
+import data_store
 
-
-def rpy2_output_error(output):
-    try:
-        decoded_output = output.decode('utf-8')
-        print(decoded_output)
-    except UnicodeDecodeError as e:
-        print("R output contained characters that could not be decoded:", e)
-
-callbacks.consolewrite_print = rpy2_output_error
-callbacks.consolewrite_warnerror = rpy2_output_error
+# Familles des colonnes de datas/Garch_VaR_95.csv et Garch_VaR_99.csv
+COPULA_FAMILIES = ["Normal", "Student", "Plackett", "Clayton", "Frank", "Gumbel"]
 
 class Garch():
     def __init__(self,
@@ -33,12 +24,20 @@ class Garch():
                  price2=None,
                  theta2=None,
                  copula_type='Normal',
-                 h=None):
+                 h=None,
+                 copula_backend='R',
+                 n_simulations=10000,
+                 seed=None):
 
         self.returns = np.array(returns)
         self.price = price
         self.theta = np.array(theta)
         self.copula_type = copula_type
+        self.copula_backend = copula_backend
+        self.n_simulations = n_simulations
+        self.seed = seed
+        # Dernière estimation de la copule, point de départ de la fenêtre suivante
+        self.copula_estimate = None
         self.setup_parameters(self.returns, self.theta, h)
         self.h = h
         if copula_garch:
@@ -82,23 +81,22 @@ class Garch():
         return getattr(self, f'predicted_variance{suffix}')
 
     def model(self, theta, returns, var_incondi):
-        mu, alpha, beta = theta
-        w = (1 - alpha - beta) * var_incondi
-        e = np.concatenate([[0], (returns - mu)**2])
-        T = len(e)
-        var_condi = np.full(T, var_incondi)
-        for i in range(1, T):
-            var_condi[i] = w + alpha * e[i-1] + beta * var_condi[i-1]
-        var_condi[var_condi <= 0] = np.min(var_condi[var_condi > 0])
-        ll = 0.5 * np.log(2 * np.pi) + 0.5 * np.log(var_condi[1:]) + 0.5 * (e[1:] / var_condi[1:])
-        return np.sum(ll)
+        nll, _, _ = garch_likelihood(np.asarray(theta, dtype=np.float64),
+                                     np.ascontiguousarray(returns, dtype=np.float64),
+                                     var_incondi)
+        return nll
 
     def optim(self, returns, var_incondi, theta):
-        bounds = [(1e-8, None), (1e-8, 0.9999), (1e-8, 0.9999)]
-        result = minimize(self.model, theta, args=(returns, var_incondi), bounds=bounds, tol=1e-8)
-        return result.x, result.fun
+        theta_opti, nll, var_condi = optimize_garch(returns, var_incondi, theta)
+        # Chemin des variances de la dernière évaluation, réutilisé par fit
+        self._last_fit = (theta_opti, returns, var_incondi, var_condi)
+        return theta_opti, nll
 
     def fit(self, theta_opti, returns, var_incondi):
+        last_fit = getattr(self, '_last_fit', None)
+        if (last_fit is not None and last_fit[1] is returns and last_fit[2] == var_incondi
+                and np.array_equal(last_fit[0], theta_opti)):
+            return last_fit[3].copy()
         mu, alpha, beta = theta_opti
         w = (1 - alpha - beta) * var_incondi
         e = np.concatenate([[0], (returns - mu) ** 2])
@@ -119,16 +117,13 @@ class Garch():
         return predicted_mean
 
     def predict_variance(self, returns, theta_opti, var_condi, var_incondi, h):
-        mu, alpha, beta = theta_opti
-        w = (1 - alpha - beta) * var_incondi
-        var_last = w + alpha*((returns[-1]-mu)**2) + beta*var_condi[-1]
-        variance_predictions = [var_last]
-        for h in range(1, h):
-            variance_prediction = (w * np.sum([(alpha+beta)**i for i in range(h-1)]) +
-                                   (alpha+beta)**(h-1) * (alpha*((returns[-1]-mu)**2)+beta*var_condi[-1]))
-            variance_predictions.append(variance_prediction)
+        variance_predictions, _ = variance_term_structure(theta_opti, var_incondi, returns[-1], var_condi[-1], h)
         return variance_predictions
 
+    def predict_cumulative_variance(self, returns, theta_opti, var_condi, var_incondi, h):
+        _, cumulative_variance = variance_term_structure(theta_opti, var_incondi, returns[-1], var_condi[-1], h)
+        return cumulative_variance
+
     def save_residuals(self, file_name='residuals.csv'):
         if self.copula_garch and hasattr(self, 'residuals2'):
 
@@ -154,105 +149,167 @@ class Garch():
         else:
             print("Résidus pas dispos pour les deux séries")
 
-    def fit_copula_garch(self, residuals_1, residuals_2):
-        script_path = "C:/Users/roman/OneDrive/Bureau/M2EIF/S2/Projet_GQ2/code/fit_copula.R"
-
-        robjects.r(f'source("{script_path}")')
-
-        df = pd.DataFrame({
-            'Residuals1': residuals_1,
-            'Residuals2': residuals_2
-        })
-        r_dataframe = pandas2ri.py2rpy(df)
+    def fit_copula_garch(self, residuals_1, residuals_2, rng=None):
+        if self.copula_backend == 'native':
+            return self.fit_copula_garch_native(residuals_1, residuals_2, rng)
 
+        # rpy2 n'est importé que pour le backend R
+        from r_bridge import get_r_bridge
         try:
-            r_fit_copula = robjects.globalenv['fit_copula']
-            result = r_fit_copula(r_dataframe, self.copula_type)
-            simulated_residuals = np.array(result)
-            return simulated_residuals
+            return get_r_bridge().fit_copula(np.column_stack((residuals_1, residuals_2)),
+                                             self.copula_type,
+                                             self.n_simulations)
         except Exception as e:
             print("Error during copula fitting:", e)
             return None
 
+    def fit_copula_garch_native(self, residuals_1, residuals_2, rng=None):
+        """
+        Equivalent en Python de fit_copula.R : estimation de la copule (démarrée à chaud
+        depuis la fenêtre précédente) puis simulation de n_simulations résidus.
+        """
+        if rng is None:
+            rng = np.random.default_rng(self.seed)
+        fit = copula_mle.fit_copula(np.column_stack((residuals_1, residuals_2)),
+                                    self.copula_type,
+                                    start=self.copula_estimate)
+        self.copula_estimate = fit['estimate']
+        return copula_sampler.simulate_copula_residuals(self.copula_type,
+                                                        fit['estimate'],
+                                                        self.n_simulations,
+                                                        rng)
+
+    def window_rng(self, i):
+        """
+        Générateur propre à la fenêtre i, pour que chaque fenêtre soit reproductible
+        """
+        return rolling_backtest.window_rng(self.seed, i)
+
 
     def fitted_copula_params(self):
         window_size = 1135
         returns_window = self.returns
         returns2_window = self.returns2
 
-        theta_opti_1, _ = self.optim(returns_window, self.get_var_incondi())
+        theta_opti_1, _ = self.optim(returns_window, self.get_var_incondi(), self.theta)
         var_condi_1 = self.fit(theta_opti_1, returns_window, self.get_var_incondi())
         residuals_1 = self.compute_residuals(theta_opti_1, returns_window, var_condi_1)
-        theta_opti_2, _ = self.optim(returns2_window, self.get_var_incondi(suffix='2'))
+        theta_opti_2, _ = self.optim(returns2_window, self.get_var_incondi(suffix='2'), self.theta2)
         var_condi_2 = self.fit(theta_opti_2, returns2_window, self.get_var_incondi(suffix='2'))
         residuals_2 = self.compute_residuals(theta_opti_2, returns2_window, var_condi_2)
 
-        script_path = "C:/Users/roman/OneDrive/Bureau/M2EIF/S2/Projet_GQ2/code/fit_copula.R"
-
-        robjects.r(f'source("{script_path}")')
-
-        df = pd.DataFrame({
-            'Residuals1': residuals_1,
-            'Residuals2': residuals_2
-        })
-        r_dataframe = pandas2ri.py2rpy(df)
+        if self.copula_backend == 'native':
+            result = copula_mle.fit_copula(np.column_stack((residuals_1, residuals_2)), self.copula_type)
+            print(result)
+            return result
 
+        from r_bridge import get_r_bridge
         try:
-            r_fit_copula_params = robjects.globalenv['fit_copula_params']
-            result = r_fit_copula_params(r_dataframe, self.copula_type)
+            result = get_r_bridge().fit_copula_params(np.column_stack((residuals_1, residuals_2)), self.copula_type)
             print(result)
+            return result
         except Exception as e:
             print("Error during copula fitting:", e)
             return None
 
 
 
-    def main_loop(self):
-        T = len(self.returns)
-        window_size = 1280
-        perc95_VaR = []
-        perc99_VaR = []
+    def fit_rolling_marginals(self, n_windows=840, window_size=1280, n_jobs=1, chunk_size=rolling_backtest.CHUNK_SIZE):
+        """
+        GARCH des deux actifs sur toutes les fenêtres (démarrage à chaud, blocs répartis sur n_jobs processus)
+        """
+        return rolling_backtest.fit_rolling_garch(np.column_stack((self.returns, self.returns2)),
+                                                  [self.get_var_incondi(), self.get_var_incondi(suffix='2')],
+                                                  n_windows, window_size, n_jobs, chunk_size)
+
+    def simulate_copula_windows(self, residuals_windows, copula_type, batch_size=120, n_jobs=1,
+                                chunk_size=rolling_backtest.CHUNK_SIZE):
+        """
+        Simulation des résidus par la copule pour toutes les fenêtres (en quelques appels R pour le backend R)
+        """
+        if self.copula_backend == 'native':
+            return rolling_backtest.simulate_rolling_copula(residuals_windows, copula_type, self.n_simulations,
+                                                            self.seed, n_jobs, chunk_size)
+        from r_bridge import get_r_bridge
+        seeds = None if self.seed is None else self.seed + np.arange(len(residuals_windows))
+        return get_r_bridge().fit_copula_batch(residuals_windows, copula_type, self.n_simulations, seeds, batch_size)
+
+    def windows_VaR(self, MC_residuals_windows, garch_windows, window_size, weights=None, positions=0.1,
+                    alphas=(0.05, 0.01)):
+        """
+        Revalorisation de tous les tirages en une fois, prix de la veille de chaque prévision
+        :return: VaR et ES (n_windows x len(alphas))
+        """
+        last_prices = self.window_prices(len(MC_residuals_windows), window_size)
+        pnl = rolling_backtest.portfolio_pnl(MC_residuals_windows, garch_windows['var_pred'],
+                                             garch_windows['mean_pred'], last_prices, weights, positions)
+        return rolling_backtest.value_at_risk(pnl, alphas)
+
+    def window_prices(self, n_windows, window_size):
+        """
+        Prix de la veille de chaque prévision (n_windows x 2)
+        """
+        return np.column_stack((np.asarray(self.price)[window_size - 1:window_size - 1 + n_windows],
+                                np.asarray(self.price2)[window_size - 1:window_size - 1 + n_windows]))
+
+    def main_loop(self, n_windows=840, window_size=1280, batch_size=120, n_jobs=1,
+                  chunk_size=rolling_backtest.CHUNK_SIZE, weights=None, positions=0.1):
         print("Start estimation of the VaR")
-        for i in tqdm(range(840)):
-            print(f'iteration {i}/500')
-            start_index = i
-            end_index = window_size + i
-            returns_window = self.returns[start_index:end_index]
-            returns2_window = self.returns2[start_index:end_index]
-            mu1 = np.mean(returns_window)
-            mu2 = np.mean(returns2_window)
-            initial_params1 = [mu1, 0.1, 0.1]
-            initial_params2 = [mu2, 0.1, 0.1]
-
-            theta_opti_1, _ = self.optim(returns_window, self.get_var_incondi(), initial_params1)
-            var_condi_1 = self.fit(theta_opti_1, returns_window, self.get_var_incondi())
-            residuals_1 = self.compute_residuals(theta_opti_1, returns_window, var_condi_1)
-            var_condi_1_pred = self.predict_variance(returns_window, theta_opti_1, var_condi_1, self.get_var_incondi(), h=1)
-            mean_1_pred = self.predict_mean(theta_opti_1, 1)
-            theta_opti_2, _ = self.optim(returns2_window, self.get_var_incondi(suffix='2'), initial_params2)
-            var_condi_2 = self.fit(theta_opti_2, returns2_window, self.get_var_incondi(suffix='2'))
-            residuals_2 = self.compute_residuals(theta_opti_2, returns2_window, var_condi_2)
-            var_condi_2_pred = self.predict_variance(returns2_window, theta_opti_2, var_condi_2,
-                                                     self.get_var_incondi(suffix='2'), h=1)
-            mean_2_pred = self.predict_mean(theta_opti_2, 1)
-            MC_residuals = self.fit_copula_garch(residuals_1, residuals_2)
-
-            portfolio = []
-            for j in range(len(MC_residuals)):
-                simu_resid_1 = MC_residuals[j, 0]
-                simu_resid_2 = MC_residuals[j, 1]
-                simu_return_1 = np.sqrt(var_condi_1_pred) * simu_resid_1 + mean_1_pred
-                simu_return_2 = np.sqrt(var_condi_2_pred) * simu_resid_2 + mean_2_pred
-                price_1_t_1 = self.price[end_index - 1]
-                price_2_t_1 = self.price2[end_index - 1]
-                portfolio_value = ((np.exp(simu_return_1)*price_1_t_1 - price_1_t_1) + (
-                            np.exp(simu_return_2)*price_2_t_1 - price_2_t_1))/2
-                portfolio.append(portfolio_value/10)
-
-            portfolio.sort()
-            perc95_VaR.append(np.percentile(portfolio, 5))
-            perc99_VaR.append(np.percentile(portfolio, 1))
+        garch_windows = self.fit_rolling_marginals(n_windows, window_size, n_jobs, chunk_size)
+        MC_residuals_windows = self.simulate_copula_windows(garch_windows['residuals'], self.copula_type,
+                                                            batch_size, n_jobs, chunk_size)
+        VaR, ES = self.windows_VaR(MC_residuals_windows, garch_windows, window_size, weights, positions)
+        perc95_VaR = list(VaR[:, 0])
+        perc99_VaR = list(VaR[:, 1])
+        self.perc95_ES = list(ES[:, 0])
+        self.perc99_ES = list(ES[:, 1])
+
+        return perc95_VaR, perc99_VaR
 
+    def main_loop_fhs(self, n_windows=840, window_size=1280, n_jobs=1, chunk_size=rolling_backtest.CHUNK_SIZE,
+                      weights=None, positions=0.1):
+        """
+        Alternative à main_loop sans copule : simulation historique filtrée sur les résidus
+        standardisés joints de chaque fenêtre (mêmes graines par fenêtre, mêmes sorties que main_loop)
+        """
+        print("Start estimation of the VaR")
+        garch_windows = self.fit_rolling_marginals(n_windows, window_size, n_jobs, chunk_size)
+        VaR, ES = rolling_backtest.fhs_value_at_risk(garch_windows['residuals'], garch_windows['var_pred'],
+                                                     garch_windows['mean_pred'], self.window_prices(n_windows, window_size),
+                                                     self.n_simulations, self.seed, weights, positions)
+        perc95_VaR = list(VaR[:, 0])
+        perc99_VaR = list(VaR[:, 1])
+        self.perc95_ES = list(ES[:, 0])
+        self.perc99_ES = list(ES[:, 1])
+
+        return perc95_VaR, perc99_VaR
+
+    def main_loop_copulas(self, copula_types=COPULA_FAMILIES, n_windows=840, window_size=1280, batch_size=120,
+                          n_jobs=1, chunk_size=rolling_backtest.CHUNK_SIZE, weights=None, positions=0.1,
+                          output_dir=None):
+        """
+        Backtest de plusieurs copules en une passe : les GARCH sont estimés une seule fois par fenêtre,
+        chaque famille est estimée et simulée sur les mêmes résidus (mêmes graines par fenêtre).
+        :param output_dir: si renseigné, écrit Garch_VaR_95.csv et Garch_VaR_99.csv (une colonne par copule)
+        :return: DataFrames des VaR à 95% et 99%
+        """
+        print("Start estimation of the VaR")
+        garch_windows = self.fit_rolling_marginals(n_windows, window_size, n_jobs, chunk_size)
+        perc95_VaR = {}
+        perc99_VaR = {}
+        for copula_type in copula_types:
+            print(f"Copula {copula_type}")
+            MC_residuals_windows = self.simulate_copula_windows(garch_windows['residuals'], copula_type,
+                                                                batch_size, n_jobs, chunk_size)
+            VaR, _ = self.windows_VaR(MC_residuals_windows, garch_windows, window_size, weights, positions)
+            perc95_VaR[copula_type] = VaR[:, 0]
+            perc99_VaR[copula_type] = VaR[:, 1]
+
+        perc95_VaR = pd.DataFrame(perc95_VaR)
+        perc99_VaR = pd.DataFrame(perc99_VaR)
+        if output_dir is not None:
+            perc95_VaR.to_csv(os.path.join(output_dir, 'Garch_VaR_95.csv'), index=False)
+            perc99_VaR.to_csv(os.path.join(output_dir, 'Garch_VaR_99.csv'), index=False)
         return perc95_VaR, perc99_VaR
 
     def plot(self):
@@ -272,8 +329,7 @@ class Garch():
         plt.show()
 
 if __name__ == "__main__":
-    df = pd.read_excel('C:/Users/roman/OneDrive/Bureau/M2EIF/S2/Projet_GQ2/datas/SP500NASDAQ2.xls', header=0,
-                       index_col=0)
+    df = data_store.load_prices('SP500NASDAQ2.xls')
     NASDAQ_price = df.iloc[:, 0]
     SP500_price = df.iloc[:, 1]
     NASDAQ_logreturn = np.log(df['NASDAQCOM']).diff().dropna()
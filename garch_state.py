@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Etat d'un GARCH(1,1) mis à jour rendement par rendement.
+
+Chaque nouveau rendement ne coûte qu'une étape de la récursion (O(1)) ; les paramètres ne sont
+ré-estimés que tous les refit_every rendements, ou quand la log-vraisemblance des rendements
+récents dérive par rapport à celle de l'échantillon d'estimation.
+"""
+import numpy as np
+from garch_kernel import optimize_garch, variance_term_structure
+
+LOG_2PI = np.log(2 * np.pi)
+
+
+class GarchState:
+    def __init__(self, returns, theta, refit_every=5, drift_threshold=None, window_size=None):
+        """
+        :param returns: historique servant à la première estimation
+        :param theta: point de départ [mu, alpha, beta]
+        :param refit_every: nombre de rendements entre deux ré-estimations (5 : hebdomadaire), None pour désactiver
+        :param drift_threshold: excès cumulé de - log-vraisemblance (en nats) déclenchant une ré-estimation
+        :param window_size: ré-estimation sur les window_size derniers rendements (tout l'historique par défaut)
+        """
+        self._setup(returns, refit_every, drift_threshold, window_size)
+        self.theta = np.asarray(theta, dtype=np.float64)
+        self.refit()
+
+    def _setup(self, returns, refit_every, drift_threshold, window_size):
+        returns = np.asarray(returns, dtype=np.float64)
+        self._history = np.empty(max(2 * len(returns), 1))
+        self._history[:len(returns)] = returns
+        self.n_obs = len(returns)
+        self.refit_every = refit_every
+        self.drift_threshold = drift_threshold
+        self.window_size = window_size
+        self.n_refits = 0
+
+    @classmethod
+    def from_garch(cls, model, suffix='', refit_every=5, drift_threshold=None, window_size=None):
+        """
+        Reprend une estimation déjà faite par Garch (sans ré-optimiser)
+        """
+        state = cls.__new__(cls)
+        returns = np.asarray(getattr(model, f'returns{suffix}'), dtype=np.float64)
+        state._setup(returns, refit_every, drift_threshold, window_size)
+        state._set_estimation(model.get_theta_opti(suffix), model.get_var_incondi(suffix), returns,
+                              model.get_var_condi(suffix))
+        return state
+
+    @property
+    def history(self):
+        return self._history[:self.n_obs]
+
+    def _set_estimation(self, theta, var_incondi, returns, var_condi):
+        self.theta = np.asarray(theta, dtype=np.float64)
+        self.var_incondi = var_incondi
+        self.last_return = returns[-1]
+        self.last_var = var_condi[-1]
+        mu, alpha, beta = self.theta
+        e = (returns - mu) ** 2
+        self.mean_nll = np.mean(0.5 * (LOG_2PI + np.log(var_condi[1:]) + e / var_condi[1:]))
+        self.since_refit = 0
+        self.drift = 0.0
+
+    def refit(self):
+        """
+        Ré-estimation complète, démarrée depuis les paramètres courants
+        """
+        returns = self.history if self.window_size is None else self.history[-self.window_size:]
+        var_incondi = np.var(returns)
+        theta_opti, _, var_condi = optimize_garch(returns, var_incondi, self.theta)
+        self._set_estimation(theta_opti, var_incondi, returns, var_condi)
+        self.n_refits += 1
+
+    def needs_refit(self):
+        if self.refit_every is not None and self.since_refit >= self.refit_every:
+            return True
+        return self.drift_threshold is not None and self.drift > self.drift_threshold
+
+    def update(self, new_return):
+        """
+        Intègre un nouveau rendement : une étape de la récursion, ré-estimation si le calendrier
+        ou le déclencheur de dérive l'exige
+        :return: variance prévue pour le jour suivant
+        """
+        if self.n_obs == len(self._history):
+            self._history = np.concatenate((self._history, np.empty(len(self._history))))
+        self._history[self.n_obs] = new_return
+        self.n_obs += 1
+
+        mu = self.theta[0]
+        var = self.next_variance()
+        nll = 0.5 * (LOG_2PI + np.log(var) + (new_return - mu) ** 2 / var)
+        # Excès cumulé de - log-vraisemblance par rapport à l'échantillon d'estimation
+        self.drift = max(self.drift + nll - self.mean_nll, 0.0)
+        self.last_return = new_return
+        self.last_var = var
+        self.since_refit += 1
+
+        if self.needs_refit():
+            self.refit()
+        return self.next_variance()
+
+    def next_variance(self):
+        mu, alpha, beta = self.theta
+        return (1 - alpha - beta) * self.var_incondi + alpha * (self.last_return - mu) ** 2 + beta * self.last_var
+
+    def update_many(self, new_returns):
+        return np.array([self.update(r) for r in new_returns])
+
+    def predict_variance(self, h=1):
+        variances, _ = variance_term_structure(self.theta, self.var_incondi, self.last_return, self.last_var, h)
+        return variances
+
+    def predict_cumulative_variance(self, h):
+        _, cumulative_variance = variance_term_structure(self.theta, self.var_incondi, self.last_return,
+                                                         self.last_var, h)
+        return cumulative_variance
+
+    def predict_mean(self):
+        return self.theta[0]
@@ -3,6 +3,8 @@ from scipy.stats import norm
 from scipy.optimize import minimize as min
 import pandas as pd
 import Model_MSM as MSM
+import copula_profile
+import data_store
 
 def gaussian_copula_log_likelihood(rho, f1, f2, F1, F2):
     ll = 0
@@ -42,37 +44,23 @@ def bivariate_gaussian_copula_pdf(u1, u2, rho):
             return result[0]
 
 # Define the optimization routine
-def optimize_rho(fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq, initial_rho, bounds):
-    # Minimize negative log-likelihood to find optimal rho
-    result = min(gaussian_copula_log_likelihood, initial_rho, args=(fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq),
-                 bounds=[bounds])
-
-    # Optimal value of rho
-    optimal_rho = 2*result.x[0]
-
-    # Minimum log-likelihood value
-    min_log_likelihood = result.fun
-
-    return optimal_rho, min_log_likelihood
+def optimize_rho(fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq, n_points=50):
+    # Likelihood profile over the copula_mle bounds evaluated in one pass, then L-BFGS-B
+    # from the best grid cell
+    optimal_param, min_log_likelihood, intervals = copula_profile.optimize_family(
+        "Normal", fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq, n_points)
+    return optimal_param[0], min_log_likelihood, intervals[0]
 
 if __name__ == '__main__':
-    datas = pd.read_excel('SP500NASDAQ2.xls')  # Try Latin-1 if UTF-8 fails
-
-    df = pd.DataFrame(datas)
-    df['DATE'] = pd.to_datetime(df['DATE'])
-    df.set_index('DATE', inplace=True)
+    df = data_store.load_prices('SP500NASDAQ2.xls')
 
     k_compos = 5
     index = 'SP500'
-    result_sp500, fy_sp500, Fy_sp500, pmatsp500, m0sp500, sigmasp500 = MSM.proceed_MSM_density_and_marginals_calculation(df, index, k_compos)
+    result_sp500, fy_sp500, Fy_sp500, pmatsp500, m0sp500, sigmasp500 = MSM.cached_MSM_density_and_marginals_calculation(df, index, k_compos)
     index = 'NASDAQCOM'
-    result_nasdaq, fy_nasdaq, Fy_nasdaq, pmatnasdaq, m0nasdaq, sigmanasdaq = MSM.proceed_MSM_density_and_marginals_calculation(df, index, k_compos)
-
-    # Initial values for rho and nu
-    initial_rho = 10
-    bounds = (0,0.99)  # Bounds for rho and nu
+    result_nasdaq, fy_nasdaq, Fy_nasdaq, pmatnasdaq, m0nasdaq, sigmanasdaq = MSM.cached_MSM_density_and_marginals_calculation(df, index, k_compos)
 
-    optimal_rho, min_log_likelihood = optimize_rho(fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq, initial_rho, bounds)
-    print(f"Optimal rho: {optimal_rho}, Minimum log-likelihood: {min_log_likelihood}")
+    optimal_rho, min_log_likelihood, interval = optimize_rho(fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq)
+    print(f"Optimal rho: {optimal_rho}, Minimum log-likelihood: {-min_log_likelihood}, 95% CI: {interval}")
 
     
\ No newline at end of file
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+GARCH(1,1) univariés sur N actifs.
+
+Paramètres, variances conditionnelles et résidus sont stockés dans des tableaux contigus
+(N x 3), (N x T+1) et (N x T) ; les estimations sont réparties par blocs d'actifs sur un pool
+de processus, les rendements étant partagés en mémoire. La matrice des résidus standardisés
+(T x N) alimente directement les étapes copule ou corrélation.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from garch_kernel import optimize_garch, variance_term_structure
+from rolling_backtest import make_chunks, share_array, attach_shared, get_shared, release_shared
+
+
+def fit_garch_assets(returns, var_incondi, theta_init, start, stop):
+    """
+    Estimation des actifs [start, stop) de returns (N x T)
+    :return: theta (n x 3), - log-vraisemblance (n,), variances conditionnelles (n x T+1)
+    """
+    n_assets = stop - start
+    theta = np.empty((n_assets, 3))
+    nll = np.empty(n_assets)
+    var_condi = np.empty((n_assets, returns.shape[1] + 1))
+    for k, i in enumerate(range(start, stop)):
+        theta[k], nll[k], var_condi[k] = optimize_garch(returns[i], var_incondi[i], theta_init[i])
+    return theta, nll, var_condi
+
+
+def _fit_garch_assets_task(var_incondi, theta_init, start, stop):
+    return fit_garch_assets(get_shared('returns'), var_incondi, theta_init, start, stop)
+
+
+class MultiGarch:
+    def __init__(self, returns, names=None):
+        """
+        :param returns: rendements (T x N), DataFrame ou tableau
+        """
+        if isinstance(returns, pd.DataFrame):
+            names = list(returns.columns) if names is None else names
+        self.returns = np.ascontiguousarray(np.asarray(returns, dtype=np.float64).T)
+        self.n_assets, self.n_obs = self.returns.shape
+        self.names = list(range(self.n_assets)) if names is None else list(names)
+        self.var_incondi = np.var(self.returns, axis=1)
+        self.theta = np.empty((self.n_assets, 3))
+        self.nll = np.empty(self.n_assets)
+        self.var_condi = np.empty((self.n_assets, self.n_obs + 1))
+        self.residuals = np.empty((self.n_assets, self.n_obs))
+
+    def fit(self, theta=None, n_jobs=1, chunk_size=10):
+        """
+        Estime les N GARCH
+        :param theta: points de départ (N x 3), [moyenne, 0.1, 0.1] par défaut
+        """
+        if theta is None:
+            theta = np.column_stack((self.returns.mean(axis=1), np.full(self.n_assets, 0.1), np.full(self.n_assets, 0.1)))
+        theta = np.asarray(theta, dtype=np.float64)
+        chunks = make_chunks(self.n_assets, chunk_size)
+
+        if n_jobs == 1:
+            results = [fit_garch_assets(self.returns, self.var_incondi, theta, start, stop) for start, stop in chunks]
+        else:
+            shm = share_array(self.returns)
+            try:
+                with ProcessPoolExecutor(n_jobs, initializer=attach_shared,
+                                         initargs=({'returns': (shm.name, self.returns.shape)},)) as pool:
+                    results = list(pool.map(_fit_garch_assets_task,
+                                            [self.var_incondi] * len(chunks),
+                                            [theta] * len(chunks),
+                                            [start for start, _ in chunks],
+                                            [stop for _, stop in chunks]))
+            finally:
+                release_shared([shm])
+
+        for (start, stop), (theta_chunk, nll_chunk, var_condi_chunk) in zip(chunks, results):
+            self.theta[start:stop] = theta_chunk
+            self.nll[start:stop] = nll_chunk
+            self.var_condi[start:stop] = var_condi_chunk
+        self.residuals[:] = (self.returns - self.theta[:, [0]]) / np.sqrt(self.var_condi[:, 1:])
+        return self
+
+    def standardized_residuals(self):
+        """
+        Matrice des résidus standardisés (T x N) pour les étapes copule / corrélation
+        """
+        return self.residuals.T
+
+    def residual_correlation(self):
+        return np.corrcoef(self.residuals)
+
+    def predict_mean(self):
+        return self.theta[:, 0]
+
+    def predict_variance(self, h=1):
+        """
+        :return: variances prévues à 1..h jours (N x h)
+        """
+        variances, _ = variance_term_structure(self.theta, self.var_incondi, self.returns[:, -1],
+                                               self.var_condi[:, -1], h)
+        return variances
+
+    def predict_cumulative_variance(self, h):
+        _, cumulative_variance = variance_term_structure(self.theta, self.var_incondi, self.returns[:, -1],
+                                                         self.var_condi[:, -1], h)
+        return cumulative_variance
+
+    def params_frame(self):
+        return pd.DataFrame(self.theta, index=self.names, columns=['mu', 'alpha', 'beta'])
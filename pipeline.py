@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+Exécution par étapes de la chaîne données -> log-rendements -> MSM (densités et marginales) ->
+copule -> VaR -> backtest.
+
+Chaque étape déclare ses entrées (d'autres étapes) et ses paramètres et renvoie un dictionnaire
+de tableaux. Sa sortie est conservée dans un ModelStore sous une clé calculée sur la fonction
+(nom et code source), les paramètres et le contenu des entrées : modifier une étape relance
+cette étape, modifier alpha ne relance que la VaR et le backtest,
+changer de copule ne relance pas les MSM, et une étape recalculée qui redonne la même sortie ne
+relance pas la suite. Les MSM sont relus dans le cache de Model_MSM.cached_fit_MSM, commun
+avec les scripts de copules. Les étapes indépendantes (les MSM des deux indices) tournent en parallèle
+dans un pool de processus ; run() relève la durée de chaque étape.
+"""
+import functools
+import hashlib
+import importlib
+import inspect
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import numpy as np
+import pandas as pd
+import copula_mle
+import data_store
+
+PIPELINE_DIR = os.path.join(data_store.CACHE_DIR, 'pipeline')
+
+
+class Stage:
+    """
+    :param func: fonction de niveau module, appelée avec les sorties des entrées (dans l'ordre)
+                 puis les paramètres en arguments nommés ; renvoie un dictionnaire de tableaux
+    :param cache: False pour une étape peu coûteuse ou conservée ailleurs, toujours exécutée (sa
+                  sortie reste hachée)
+    """
+    def __init__(self, name, func, inputs=(), params=None, cache=True):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.params = {} if params is None else params
+        self.cache = cache
+
+
+@functools.lru_cache(maxsize=None)
+def _source_hash(func):
+    return hashlib.sha256(inspect.getsource(func).encode('utf-8')).hexdigest()[:16]
+
+
+def stage_function(stage):
+    """
+    Identifiant de la fonction de l'étape : nom qualifié et empreinte de son code source (le code
+    des fonctions qu'elle appelle n'y entre pas)
+    """
+    return f'{stage.func.__module__}.{stage.func.__qualname__}:{_source_hash(stage.func)}'
+
+
+def code_module(name):
+    """
+    Import d'un module du dossier code (backtests des VaR classiques), après ceux du dossier principal
+    """
+    code_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'code')
+    if code_dir not in sys.path:
+        sys.path.append(code_dir)
+    return importlib.import_module(name)
+
+
+def _timed(func, inputs, params):
+    start = time.perf_counter()
+    outputs = func(*inputs, **params)
+    return {name: np.asarray(value) for name, value in outputs.items()}, time.perf_counter() - start
+
+
+class Pipeline:
+    def __init__(self, stages, store=None, n_jobs=1):
+        self.stages = {stage.name: stage for stage in stages}
+        self.store = data_store.ModelStore(PIPELINE_DIR) if store is None else store
+        self.n_jobs = n_jobs
+        self.timings = None
+
+    def _required(self, targets):
+        required, stack = set(), list(targets)
+        while stack:
+            name = stack.pop()
+            if name not in required:
+                required.add(name)
+                stack.extend(self.stages[name].inputs)
+        return required
+
+    def _key(self, stage, hashes):
+        # le nom de l'étape n'entre pas dans la clé : une même étape partage son cache entre chaînes
+        return self.store.key(func=stage_function(stage), params=stage.params,
+                              inputs=[hashes[name] for name in stage.inputs])
+
+    def run(self, targets=None, on_complete=None, on_error=None):
+        """
+        :param targets: étapes voulues (toutes par défaut), leurs ascendants sont exécutés au besoin
+        :param on_complete: appelée avec (étape, sorties) dès qu'une étape est disponible
+        :param on_error: appelée avec (étape, exception) pour une étape en échec et pour chacune des
+                         étapes qui en dépendent, les autres branches continuent ; sans elle
+                         l'exception interrompt run()
+        :return: {étape: sorties} ; self.timings : statut (cache / exécutée / échec) et durée de chaque étape
+        """
+        pending = self._required(self.stages if targets is None else targets)
+        outputs, hashes, keys, timings = {}, {}, {}, []
+        failed = {}
+        running = {}
+        pool = ProcessPoolExecutor(self.n_jobs) if self.n_jobs > 1 else None
+
+        def finish(name, result, status, seconds):
+            outputs[name] = result
+            hashes[name] = self.store.key(**result)
+            timings.append({'stage': name, 'status': status, 'seconds': seconds})
+            if on_complete is not None:
+                on_complete(name, result)
+
+        def fail(name, error, seconds=0.0):
+            if on_error is None:
+                raise error
+            failed[name] = error
+            timings.append({'stage': name, 'status': 'failed', 'seconds': seconds})
+            on_error(name, error)
+
+        try:
+            while pending or running:
+                ready = [name for name in pending
+                         if all(i in outputs or i in failed for i in self.stages[name].inputs)]
+                for name in ready:
+                    pending.remove(name)
+                    stage = self.stages[name]
+                    upstream = [failed[i] for i in stage.inputs if i in failed]
+                    if upstream:
+                        fail(name, upstream[0])
+                        continue
+                    keys[name] = self._key(stage, hashes)
+                    cached = self.store.load(keys[name]) if stage.cache else None
+                    if cached is not None:
+                        finish(name, cached, 'cache', 0.0)
+                        continue
+                    args = (stage.func, [outputs[i] for i in stage.inputs], stage.params)
+                    if pool is None:
+                        try:
+                            result, seconds = _timed(*args)
+                        except Exception as error:
+                            fail(name, error)
+                            continue
+                        self._store(stage, keys[name], result)
+                        finish(name, result, 'run', seconds)
+                    else:
+                        running[pool.submit(_timed, *args)] = name
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        result, seconds = future.result()
+                    except Exception as error:
+                        fail(name, error)
+                        continue
+                    self._store(self.stages[name], keys[name], result)
+                    finish(name, result, 'run', seconds)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        self.timings = pd.DataFrame(timings, columns=['stage', 'status', 'seconds'])
+        return outputs
+
+    def _store(self, stage, key, result):
+        if stage.cache:
+            self.store.save(key, result)
+
+
+# =============================================================================
+# Étapes de la chaîne MSM - copule - VaR
+# =============================================================================
+def returns_stage(source, index):
+    import Model_MSM as MSM
+    return {'returns': MSM.data_from_df(data_store.load_prices(source).copy(), index)}
+
+
+def MSM_stage(returns, index, k_compos, seed, bounds):
+    """
+    Estimation, densités et marginales (Model_MSM.fit_MSM), sous la même clé que pour les scripts de copules
+    """
+    import Model_MSM as MSM
+    return dict(MSM.cached_fit_MSM(returns['returns'], index, k_compos, seed, bounds))
+
+
+def copula_stage(model_1, model_2, copula_type):
+    fit = copula_mle.fit_copula_uniforms(model_1['Fy'], model_2['Fy'], copula_type)
+    return {'estimate': fit['estimate'], 'logLik': fit['logLik'], 'AIC': fit['AIC']}
+
+
+def copula_density(u, v, params, copula_type):
+    """
+    Densité de copule au format attendu par Calculate_VaR
+    """
+    return np.exp(copula_mle.copula_log_pdf(copula_type, u, v, params))
+
+
+def VaR_stage(model_1, model_2, copula, k_compos, copula_type, alpha, last, tolerance):
+    """
+    VaR des last dernières lignes de pmat (la dernière est la prévision hors échantillon)
+    """
+    import calculate_MSM_VaR
+    VaR = calculate_MSM_VaR.Calculate_VaR(model_1['pmat'][-last:], model_1['params'][2] / 100, model_1['params'][3],
+                                          model_2['pmat'][-last:], model_2['params'][2] / 100, model_2['params'][3],
+                                          k_compos, np.asarray(copula['estimate']),
+                                          functools.partial(copula_density, copula_type=copula_type),
+                                          alpha, tolerance)
+    return {'VaR': VaR.VaR_calculation()}
+
+
+def backtest_stage(returns_1, returns_2, VaR, alpha, weights):
+    """
+    Dépassements du portefeuille (rendements centrés du modèle) : la ligne i de la VaR porte sur
+    la date T + 1 - last + i, la dernière n'a pas encore de rendement
+    """
+    backtest_statistics = code_module('backtest_stats').backtest_statistics
+    portfolio = np.hstack([returns_1['returns'], returns_2['returns']]) @ np.asarray(weights)
+    n_realized = len(VaR['VaR']) - 1
+    realized = portfolio[len(portfolio) - n_realized - 1:]
+    statistics, _, _ = backtest_statistics(realized, np.append(VaR['VaR'][:-1], np.nan)[:, None], alpha)
+    return statistics
+
+
+def MSM_copula_pipeline(source='SP500NASDAQ2.xls', indices=('SP500', 'NASDAQCOM'), k_compos=5, copula_type='Student',
+                        alpha=0.05, seed=1, bounds=None, last=100, tolerance=0.005, weights=(0.5, 0.5), n_jobs=2,
+                        store=None):
+    """
+    Chaîne complète pour deux indices, chaque branche d'indice indépendante de l'autre
+    """
+    import Model_MSM as MSM
+    bounds = MSM.MSM_BOUNDS if bounds is None else bounds
+    stages = []
+    for index in indices:
+        # MSM déjà conservé par cached_fit_MSM : pas de seconde copie dans le cache du pipeline
+        stages += [
+            Stage(f'returns_{index}', returns_stage, params={'source': source, 'index': index}, cache=False),
+            Stage(f'MSM_{index}', MSM_stage, [f'returns_{index}'],
+                  {'index': index, 'k_compos': k_compos, 'seed': seed, 'bounds': bounds}, cache=False),
+        ]
+    first, second = indices
+    stages += [
+        Stage('copula', copula_stage, [f'MSM_{first}', f'MSM_{second}'], {'copula_type': copula_type}),
+        Stage('VaR', VaR_stage, [f'MSM_{first}', f'MSM_{second}', 'copula'],
+              {'k_compos': k_compos, 'copula_type': copula_type, 'alpha': alpha, 'last': last, 'tolerance': tolerance}),
+        Stage('backtest', backtest_stage, [f'returns_{first}', f'returns_{second}', 'VaR'],
+              {'alpha': alpha, 'weights': list(weights)}),
+    ]
+    return Pipeline(stages, store, n_jobs)
+
+
+if __name__ == "__main__":
+
+    pipeline = MSM_copula_pipeline(copula_type='Student', alpha=0.05)
+    outputs = pipeline.run()
+    print(pipeline.timings)
+    print(pd.Series(outputs['VaR']['VaR']))
+    print({key: np.ravel(value) for key, value in outputs['backtest'].items()})
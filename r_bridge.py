@@ -0,0 +1,91 @@
+import os
+import numpy as np
+import rpy2.robjects as robjects
+from rpy2.robjects import numpy2ri
+from rpy2.robjects.conversion import localconverter
+from rpy2.rinterface_lib import callbacks
+
+
+def rpy2_output_error(output):
+    try:
+        decoded_output = output.decode('utf-8')
+        print(decoded_output)
+    except UnicodeDecodeError as e:
+        print("R output contained characters that could not be decoded:", e)
+
+callbacks.consolewrite_print = rpy2_output_error
+callbacks.consolewrite_warnerror = rpy2_output_error
+
+DEFAULT_SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fit_copula.R")
+
+
+class RCopulaBridge:
+    """
+    Session R persistante pour fit_copula.R.
+    Le script (et les packages copula / rmgarch) n'est sourcé qu'une seule fois ;
+    les résidus passent en tableaux numpy, sans conversion pandas.
+    """
+    def __init__(self, script_path=DEFAULT_SCRIPT_PATH):
+        self.script_path = script_path.replace("\\", "/")
+        robjects.r(f'source("{self.script_path}")')
+        self.r_fit_copula_matrix = robjects.globalenv['fit_copula_matrix']
+        self.r_fit_copula_batch = robjects.globalenv['fit_copula_batch']
+        self.r_fit_copula_params_matrix = robjects.globalenv['fit_copula_params_matrix']
+
+    @staticmethod
+    def _as_seed(seed):
+        return robjects.NULL if seed is None else int(seed)
+
+    def fit_copula(self, residuals, copula_type='Normal', n_sim=10000, seed=None):
+        """
+        Estimation + simulation sur une fenêtre de résidus (T x 2)
+        :return: résidus simulés (n_sim x 2)
+        """
+        residuals = np.ascontiguousarray(residuals, dtype=np.float64)
+        with localconverter(robjects.default_converter + numpy2ri.converter):
+            result = self.r_fit_copula_matrix(residuals, copula_type, n_sim, self._as_seed(seed))
+        return np.asarray(result)
+
+    def fit_copula_batch(self, residual_windows, copula_type='Normal', n_sim=10000, seeds=None, batch_size=120):
+        """
+        Estimation + simulation pour toutes les fenêtres (n_windows x T x 2) en quelques appels R.
+        :param seeds: graine R par fenêtre (ou None)
+        :return: résidus simulés (n_windows x n_sim x 2), NaN pour une fenêtre dont l'estimation a échoué
+        """
+        residual_windows = np.asarray(residual_windows, dtype=np.float64)
+        n_windows = residual_windows.shape[0]
+        simulated = np.empty((n_windows, n_sim, 2))
+        for start in range(0, n_windows, batch_size):
+            stop = min(start + batch_size, n_windows)
+            batch_seeds = robjects.NULL if seeds is None else np.asarray(seeds[start:stop], dtype=np.int32)
+            with localconverter(robjects.default_converter + numpy2ri.converter):
+                result = self.r_fit_copula_batch(residual_windows[start:stop], copula_type, n_sim, batch_seeds)
+            simulated[start:stop] = np.asarray(result)
+        return simulated
+
+    def fit_copula_params(self, residuals, copula_type='Normal'):
+        """
+        Equivalent de fit_copula_params : estimation, logLik, AIC et BIC
+        """
+        residuals = np.ascontiguousarray(residuals, dtype=np.float64)
+        with localconverter(robjects.default_converter + numpy2ri.converter):
+            result = np.asarray(self.r_fit_copula_params_matrix(residuals, copula_type))
+        # Vecteur R : c(estimate, logLik, AIC, BIC)
+        return {
+            "estimate": result[:-3],
+            "logLik": result[-3],
+            "AIC": result[-2],
+            "BIC": result[-1],
+        }
+
+
+_bridges = {}
+
+
+def get_r_bridge(script_path=DEFAULT_SCRIPT_PATH):
+    """
+    Renvoie la session R déjà initialisée pour ce script (créée au premier appel)
+    """
+    if script_path not in _bridges:
+        _bridges[script_path] = RCopulaBridge(script_path)
+    return _bridges[script_path]
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+Backtest glissant GARCH-copule réparti sur un pool de processus.
+
+Les fenêtres sont découpées en blocs contigus de taille fixe. Dans un bloc, chaque fenêtre
+démarre l'optimisation depuis le theta_opti de la fenêtre précédente (la première depuis
+[moyenne, 0.1, 0.1]) et la copule depuis l'estimation précédente : les résultats ne dépendent
+que du découpage en blocs, pas du nombre de processus.
+Les rendements et les résidus sont placés en mémoire partagée, les tâches ne transportent
+que des indices.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import copula_mle
+import copula_sampler
+from garch_kernel import optimize_garch, variance_term_structure
+
+# Nombre de fenêtres par bloc (une fenêtre sur CHUNK_SIZE est démarrée à froid)
+CHUNK_SIZE = 60
+
+# Tableaux en mémoire partagée attachés dans chaque processus : clé -> (segment, tableau)
+_shared = {}
+
+
+def window_rng(seed, i):
+    """
+    Générateur propre à la fenêtre i, pour que chaque fenêtre soit reproductible
+    """
+    if seed is None:
+        return np.random.default_rng()
+    return np.random.default_rng([seed, i])
+
+
+def make_chunks(n_windows, chunk_size=CHUNK_SIZE):
+    return [(start, min(start + chunk_size, n_windows)) for start in range(0, n_windows, chunk_size)]
+
+
+def share_array(array):
+    """
+    Copie un tableau float64 dans un segment de mémoire partagée
+    """
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=np.float64, buffer=shm.buf)[:] = array
+    return shm
+
+
+def attach_shared(specs):
+    """
+    Initialiseur des processus : specs = {clé: (nom du segment, forme)}
+    """
+    for key, (name, shape) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _shared[key] = (shm, np.ndarray(shape, dtype=np.float64, buffer=shm.buf))
+
+
+def get_shared(key):
+    return _shared[key][1]
+
+
+def release_shared(segments):
+    for shm in segments:
+        shm.close()
+        shm.unlink()
+
+
+def fit_garch_chunk(returns, var_incondi, start, stop, window_size):
+    """
+    GARCH(1,1) sur les fenêtres [start, stop) de chaque colonne de returns (T x N),
+    chaque fenêtre démarrant depuis les paramètres de la précédente
+    :return: theta (n x N x 3), dernière variance conditionnelle (n x N), résidus (n x window_size x N)
+    """
+    n_windows = stop - start
+    n_assets = returns.shape[1]
+    theta = np.empty((n_windows, n_assets, 3))
+    last_var = np.empty((n_windows, n_assets))
+    residuals = np.empty((n_windows, window_size, n_assets))
+    for j in range(n_assets):
+        theta_start = None
+        for k, i in enumerate(range(start, stop)):
+            returns_window = returns[i:i + window_size, j]
+            if theta_start is None:
+                theta_start = [np.mean(returns_window), 0.1, 0.1]
+            theta_opti, _, var_condi = optimize_garch(returns_window, var_incondi[j], theta_start)
+            theta_start = theta_opti
+            theta[k, j] = theta_opti
+            residuals[k, :, j] = (returns_window - theta_opti[0]) / np.sqrt(var_condi[1:])
+            last_var[k, j] = var_condi[-1]
+    return theta, last_var, residuals
+
+
+def _fit_garch_task(start, stop, var_incondi, window_size):
+    return fit_garch_chunk(get_shared('returns'), var_incondi, start, stop, window_size)
+
+
+def fit_rolling_garch(returns, var_incondi, n_windows, window_size, n_jobs=1, chunk_size=CHUNK_SIZE, horizon=1):
+    """
+    Etape GARCH du backtest glissant pour N actifs
+    :param returns: rendements (T x N) ou (T,)
+    :param var_incondi: variance inconditionnelle de chaque actif (N,)
+    :param horizon: nombre de jours de la structure par terme des variances prévues
+    :return: dict theta, var_pred et mean_pred à 1 jour (n_windows x N), var_term (n_windows x N x horizon),
+             var_cumulative sur horizon jours (n_windows x N), residuals (n_windows x window_size x N)
+    """
+    returns = np.ascontiguousarray(returns, dtype=np.float64)
+    if returns.ndim == 1:
+        returns = returns[:, None]
+    var_incondi = np.atleast_1d(np.asarray(var_incondi, dtype=np.float64))
+    chunks = make_chunks(n_windows, chunk_size)
+
+    if n_jobs == 1:
+        results = [fit_garch_chunk(returns, var_incondi, start, stop, window_size) for start, stop in chunks]
+    else:
+        shm = share_array(returns)
+        try:
+            with ProcessPoolExecutor(n_jobs, initializer=attach_shared,
+                                     initargs=({'returns': (shm.name, returns.shape)},)) as pool:
+                results = list(pool.map(_fit_garch_task,
+                                        [start for start, _ in chunks],
+                                        [stop for _, stop in chunks],
+                                        [var_incondi] * len(chunks),
+                                        [window_size] * len(chunks)))
+        finally:
+            release_shared([shm])
+
+    theta, last_var, residuals = (np.concatenate(field) for field in zip(*results))
+    # Prévisions de toutes les fenêtres et de tous les horizons en une opération
+    last_returns = returns[window_size - 1:window_size - 1 + n_windows]
+    var_term, var_cumulative = variance_term_structure(theta, var_incondi, last_returns, last_var, horizon)
+    return {"theta": theta, "var_pred": var_term[..., 0], "mean_pred": theta[..., 0], "var_term": var_term,
+            "var_cumulative": var_cumulative, "residuals": residuals}
+
+
+def simulate_copula_chunk(residual_windows, start, stop, copula_type, n_sim, seed):
+    """
+    Estimation de la copule (démarrée depuis la fenêtre précédente du bloc) et simulation
+    de n_sim résidus pour les fenêtres [start, stop)
+    :return: résidus simulés (n x n_sim x 2)
+    """
+    simulated = np.empty((stop - start, n_sim, 2))
+    estimate = None
+    for k, i in enumerate(range(start, stop)):
+        fit = copula_mle.fit_copula(residual_windows[i], copula_type, start=estimate)
+        estimate = fit['estimate']
+        simulated[k] = copula_sampler.simulate_copula_residuals(copula_type, estimate, n_sim, window_rng(seed, i))
+    return simulated
+
+
+def _simulate_copula_task(start, stop, copula_type, n_sim, seed):
+    simulated = get_shared('simulated')
+    simulated[start:stop] = simulate_copula_chunk(get_shared('residuals'), start, stop, copula_type, n_sim, seed)
+
+
+def simulate_rolling_copula(residual_windows, copula_type, n_sim, seed=None, n_jobs=1, chunk_size=CHUNK_SIZE):
+    """
+    Etape copule (backend natif) du backtest glissant
+    :param residual_windows: résidus standardisés (n_windows x window_size x 2)
+    :return: résidus simulés (n_windows x n_sim x 2)
+    """
+    residual_windows = np.ascontiguousarray(residual_windows, dtype=np.float64)
+    n_windows = residual_windows.shape[0]
+    chunks = make_chunks(n_windows, chunk_size)
+
+    if n_jobs == 1:
+        return np.concatenate([simulate_copula_chunk(residual_windows, start, stop, copula_type, n_sim, seed)
+                               for start, stop in chunks])
+
+    shape = (n_windows, n_sim, 2)
+    shm_residuals = share_array(residual_windows)
+    shm_simulated = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 8)
+    try:
+        specs = {'residuals': (shm_residuals.name, residual_windows.shape), 'simulated': (shm_simulated.name, shape)}
+        with ProcessPoolExecutor(n_jobs, initializer=attach_shared, initargs=(specs,)) as pool:
+            list(pool.map(_simulate_copula_task,
+                          [start for start, _ in chunks],
+                          [stop for _, stop in chunks],
+                          [copula_type] * len(chunks),
+                          [n_sim] * len(chunks),
+                          [seed] * len(chunks)))
+        return np.ndarray(shape, dtype=np.float64, buffer=shm_simulated.buf).copy()
+    finally:
+        release_shared([shm_residuals, shm_simulated])
+
+
+def portfolio_pnl(simulated_residuals, var_pred, mean_pred, prices, weights=None, positions=0.1):
+    """
+    Revalorisation du portefeuille pour tous les tirages (et toutes les fenêtres) en une expression
+    :param simulated_residuals: résidus simulés (n_sim x N) ou (n_windows x n_sim x N)
+    :param var_pred, mean_pred, prices: variance, moyenne prévues et dernier prix de chaque actif (N,) ou (n_windows x N)
+    :param weights: poids des actifs (par défaut 1/N)
+    :param positions: quantité détenue par actif, scalaire ou (N,) (0.1 : le /10 du calcul d'origine)
+    :return: P&L simulé (n_sim,) ou (n_windows x n_sim)
+    """
+    simulated_residuals = np.asarray(simulated_residuals, dtype=np.float64)
+    n_assets = simulated_residuals.shape[-1]
+    if weights is None:
+        weights = np.full(n_assets, 1 / n_assets)
+    exposure = np.asarray(weights) * np.asarray(positions) * np.asarray(prices, dtype=np.float64)
+    simulated_returns = (np.sqrt(np.asarray(var_pred))[..., None, :] * simulated_residuals
+                         + np.asarray(mean_pred)[..., None, :])
+    return np.sum(np.expm1(simulated_returns) * exposure[..., None, :], axis=-1)
+
+
+def value_at_risk(pnl, alphas=(0.05, 0.01)):
+    """
+    VaR (quantiles de np.percentile, interpolation linéaire) et ES de plusieurs niveaux
+    à partir d'un seul np.partition sur le dernier axe
+    :return: VaR et ES de forme (..., len(alphas))
+    """
+    pnl = np.asarray(pnl, dtype=np.float64)
+    n = pnl.shape[-1]
+    alphas = np.asarray(alphas, dtype=np.float64)
+    position = alphas * (n - 1)
+    low = np.floor(position).astype(int)
+    high = np.minimum(low + 1, n - 1)
+    # Nombre de tirages dans la queue de chaque niveau
+    n_tail = np.maximum(np.ceil(alphas * n).astype(int), 1)
+    kth = np.unique(np.concatenate((low, high, n_tail - 1)))
+    partitioned = np.partition(pnl, kth, axis=-1)
+
+    fraction = position - low
+    var = partitioned[..., low] * (1 - fraction) + partitioned[..., high] * fraction
+    es = np.stack([partitioned[..., :m].mean(axis=-1) for m in n_tail], axis=-1)
+    return var, es
+
+
+def fhs_value_at_risk(residual_windows, var_pred, mean_pred, prices, n_sim=10000, seed=None, weights=None,
+                      positions=0.1, alphas=(0.05, 0.01), block_size=CHUNK_SIZE):
+    """
+    Simulation historique filtrée : tirage avec remise des vecteurs de résidus standardisés de chaque
+    fenêtre (la dépendance entre actifs est conservée sans copule), remis à l'échelle par la variance
+    et la moyenne prévues. Les tirages sont des indices ; le P&L est calculé par blocs de fenêtres.
+    :param residual_windows: résidus standardisés (n_windows x window_size x N)
+    :return: VaR et ES (n_windows x len(alphas))
+    """
+    residual_windows = np.asarray(residual_windows, dtype=np.float64)
+    n_windows, window_size, _ = residual_windows.shape
+    VaR = np.empty((n_windows, len(alphas)))
+    ES = np.empty((n_windows, len(alphas)))
+    for start, stop in make_chunks(n_windows, block_size):
+        indices = np.stack([window_rng(seed, i).integers(0, window_size, n_sim) for i in range(start, stop)])
+        draws = np.take_along_axis(residual_windows[start:stop], indices[..., None], axis=1)
+        pnl = portfolio_pnl(draws, var_pred[start:stop], mean_pred[start:stop], prices[start:stop], weights, positions)
+        VaR[start:stop], ES[start:stop] = value_at_risk(pnl, alphas)
+    return VaR, ES
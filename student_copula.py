@@ -9,6 +9,8 @@ from scipy.stats import t, multivariate_t
 from scipy.optimize import minimize
 import pandas as pd
 import Model_MSM as MSM
+import copula_profile
+import data_store
 
 def student_copula_pdf(u, v, rho, nu):
     # Inverse CDF (quantile function) of the univariate t-distribution
@@ -49,38 +51,23 @@ def student_copula_LL(params, f1, f2, F1, F2):
     return ll/10
 
 # Define the optimization routine
-def optimize_theta_and_nu(fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq, initial_params, bounds):
-    # Minimize negative log-likelihood to find optimal rho and nu
-    result = minimize(student_copula_LL, initial_params, args=(fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq),
-                      bounds=bounds, method='L-BFGS-B')
-    
-    # Optimal values of rho and nu
-    optimal_rho = result.x[0]
-    optimal_nu = result.x[1]
-    
-    # Minimum log-likelihood value
-    min_log_likelihood = result.fun
-    
-    return optimal_rho, optimal_nu, min_log_likelihood
+def optimize_theta_and_nu(fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq, n_points=50):
+    # Likelihood profile over the copula_mle bounds (rho, nu) evaluated in one pass,
+    # then L-BFGS-B from the best grid cell
+    optimal_params, min_log_likelihood, intervals = copula_profile.optimize_family(
+        "Student", fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq, n_points)
+    return optimal_params[0], optimal_params[1], min_log_likelihood, intervals
 
 if __name__ == '__main__':
-    datas = pd.read_excel('SP500NASDAQ2.xls')
-
-    df = pd.DataFrame(datas)
-    df['DATE'] = pd.to_datetime(df['DATE'])
-    df.set_index('DATE', inplace=True)
+    df = data_store.load_prices('SP500NASDAQ2.xls')
 
     k_compos = 5
     index = 'SP500'
-    result_sp500, fy_sp500, Fy_sp500, pmatsp500, m0sp500, sigmasp500 = MSM.proceed_MSM_density_and_marginals_calculation(df, index, k_compos)
+    result_sp500, fy_sp500, Fy_sp500, pmatsp500, m0sp500, sigmasp500 = MSM.cached_MSM_density_and_marginals_calculation(df, index, k_compos)
     index = 'NASDAQCOM'
-    result_nasdaq, fy_nasdaq, Fy_nasdaq, pmatnasdaq, m0nasdaq, sigmanasdaq = MSM.proceed_MSM_density_and_marginals_calculation(df, index, k_compos)
-
-    # Initial values for rho and nu
-    initial_params = [0.5, 5.0]
-    bounds = [(-0.99, 0.99), (2, 30)]  # Bounds for rho and nu
+    result_nasdaq, fy_nasdaq, Fy_nasdaq, pmatnasdaq, m0nasdaq, sigmanasdaq = MSM.cached_MSM_density_and_marginals_calculation(df, index, k_compos)
 
-    optimal_rho, optimal_nu, min_log_likelihood = optimize_theta_and_nu(fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq, initial_params, bounds)
-    print(f"Optimal rho: {optimal_rho}, Optimal nu: {optimal_nu}, Minimum log-likelihood: {-min_log_likelihood}")
+    optimal_rho, optimal_nu, min_log_likelihood, intervals = optimize_theta_and_nu(fy_sp500, fy_nasdaq, Fy_sp500, Fy_nasdaq)
+    print(f"Optimal rho: {optimal_rho}, Optimal nu: {optimal_nu}, Minimum log-likelihood: {-min_log_likelihood}, 95% CI: {intervals}")
 
     
\ No newline at end of file
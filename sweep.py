@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+"""
+Grilles de sensibilité (k_compos, famille de copule, alpha, taille de fenêtre) sur les trois chaînes :
+MSM-copule, VaR classiques (generate_var) et GARCH-copule (garch_model).
+
+La grille est développée sur les axes dont dépend chaque chaîne, les étapes de toutes les
+expériences sont réunies en un seul graphe où une étape identique (même fonction, mêmes
+paramètres, mêmes entrées) n'apparaît qu'une fois : un MSM par (indice, k_compos) pour toutes
+les copules et tous les alpha, une VaR classique et une simulation GARCH-copule par fenêtre pour
+tous les alpha. Le graphe est exécuté par pipeline.Pipeline (pool de processus, cache des
+étapes) ; chaque expérience terminée est ajoutée au fichier de reprise, relu au lancement suivant.
+
+Une fenêtre qui laisse moins de min_out_of_sample dates de backtest sur la source de sa chaîne
+est écartée avant l'exécution. Une étape en échec n'arrête que les expériences qui en dépendent :
+elles sont inscrites au fichier de reprise avec le statut 'failed' et le message d'erreur.
+"""
+import functools
+import itertools
+import os
+import numpy as np
+import pandas as pd
+import data_store
+import pipeline
+from pipeline import Stage
+
+DEFAULT_GRID = {
+    'k_compos': list(range(1, 11)),
+    # mêmes familles que garch_model.COPULA_FAMILIES
+    'copula_type': ['Normal', 'Student', 'Plackett', 'Clayton', 'Frank', 'Gumbel'],
+    'alpha': [0.05, 0.01, 0.005],
+    'window_size': [500, 750, 1000, 1250, 1500],
+}
+
+# Axes de la grille utilisés par chaque chaîne
+FAMILY_AXES = {
+    'MSM': ('k_compos', 'copula_type', 'alpha'),
+    'classic': ('window_size', 'alpha'),
+    'GARCH': ('window_size', 'copula_type', 'alpha'),
+}
+
+DEFAULT_SETTINGS = {
+    'MSM_source': 'SP500NASDAQ2.xls',
+    'classic_source': 'SP500NASDAQ.csv',
+    'GARCH_source': 'SP500NASDAQ2.xls',
+    'weights': [0.5, 0.5],
+    'seed': 1,
+    'last': 100,
+    'tolerance': 0.005,
+    'n_windows': 250,
+    'n_simulations': 10000,
+    'positions': 0.1,
+    # nombre minimal de dates de backtest pour les chaînes à fenêtre glissante (un an de bourse)
+    'min_out_of_sample': 250,
+}
+
+CHECKPOINT = os.path.join(data_store.RESULTS_DIR, 'sweep.csv')
+# Colonnes communes à toutes les chaînes, puis statut et statistiques de backtest_stats
+KEY_COLUMNS = ['experiment', 'family', *DEFAULT_GRID, 'model']
+STATISTICS = ['n_obs', 'n_hits', 'EFV', 'LR_uc', 'LR_ind', 'LR_cc', 'LR_duration',
+              'p_uc', 'p_ind', 'p_cc', 'p_duration', 'zone', 'binomial_cdf']
+COLUMNS = KEY_COLUMNS + ['status', 'error'] + STATISTICS
+
+
+def expand_grid(grid=DEFAULT_GRID, families=tuple(FAMILY_AXES)):
+    """
+    :return: liste d'expériences {'family': ..., axe: valeur}, chaque chaîne sur ses seuls axes
+    """
+    experiments = []
+    for family in families:
+        axes = FAMILY_AXES[family]
+        for values in itertools.product(*(grid[axis] for axis in axes)):
+            experiments.append({'family': family, **dict(zip(axes, values))})
+    return experiments
+
+
+def experiment_id(experiment):
+    return '|'.join(f'{key}={value}' for key, value in experiment.items())
+
+
+@functools.lru_cache(maxsize=None)
+def _source_length(source):
+    try:
+        return len(data_store.load_price_arrays(source, complete=True)[0])
+    except (OSError, ValueError, ImportError):
+        # source illisible : l'étape de lecture échouera et l'expérience sera notée en échec
+        return None
+
+
+def out_of_sample_size(experiment, settings):
+    """
+    :return: nombre de dates de backtest de l'expérience, None pour le MSM (last fixe) ou une source illisible
+    """
+    family = experiment['family']
+    if family == 'MSM':
+        return None
+    n_prices = _source_length(settings[f'{family}_source'])
+    if n_prices is None:
+        return None
+    if family == 'classic':
+        # VaR de window_size à T - 2 comparée au rendement du lendemain
+        return max(n_prices - experiment['window_size'] - 1, 0)
+    return max(min(settings['n_windows'], n_prices - 1 - experiment['window_size']), 0)
+
+
+# =============================================================================
+# Étapes des VaR classiques (code/backtest_runner)
+# =============================================================================
+def classic_returns_stage(source, weights):
+    prices = data_store.load_prices(source, complete=True)
+    # rendements en pourcentage, comme generate_var
+    x = np.diff(np.log(prices[['SP500', 'NASDAQCOM']].to_numpy()), axis=0, prepend=np.nan) * 100
+    return {'x': x, 'portfolio': x @ np.asarray(weights)}
+
+
+def classic_VaR_stage(returns, window_size, alphas, weights):
+    METHODS = pipeline.code_module('backtest_runner').METHODS
+    x = returns['x']
+    return {name: method(x, np.asarray(weights), alphas, window_size) for name, method in METHODS.items()}
+
+
+def classic_backtest_stage(returns, VaR, window_size, alpha, alphas):
+    backtest_statistics = pipeline.code_module('backtest_stats').backtest_statistics
+    k = list(alphas).index(alpha)
+    names = list(VaR)
+    columns = np.column_stack([VaR[name][window_size:, k] for name in names])
+    statistics, _, _ = backtest_statistics(returns['portfolio'][window_size:], columns, alpha)
+    statistics['model'] = np.array(names)
+    return statistics
+
+
+# =============================================================================
+# Étapes GARCH-copule (garch_model, backend natif)
+# =============================================================================
+def GARCH_windows_stage(source, window_size, n_windows, seed):
+    from garch_model import Garch
+    # les deux séries sur les mêmes dates (copule)
+    df = data_store.load_prices(source, complete=True)
+    NASDAQ_logreturn = np.log(df['NASDAQCOM']).diff().dropna()
+    SP500_logreturn = np.log(df['SP500']).diff().dropna()
+    model = Garch(returns=SP500_logreturn, price=df['SP500'], theta=[np.mean(SP500_logreturn), 0.1, 0.1],
+                  copula_garch=True, returns2=NASDAQ_logreturn, price2=df['NASDAQCOM'],
+                  theta2=[np.mean(NASDAQ_logreturn), 0.1, 0.1], h=1,
+                  copula_backend='native', seed=seed)
+    n_windows = min(n_windows, len(model.returns) - window_size)
+    if n_windows < 1:
+        raise ValueError(f'window_size={window_size} leaves no out-of-sample date ({len(model.returns)} returns)')
+    windows = model.fit_rolling_marginals(n_windows, window_size)
+    windows['prices'] = model.window_prices(n_windows, window_size)
+    # rendement effectivement observé à la date prévue par chaque fenêtre
+    windows['realized'] = np.column_stack((model.returns, model.returns2))[window_size:window_size + n_windows]
+    return windows
+
+
+def GARCH_VaR_stage(windows, copula_type, alphas, n_simulations, seed, weights, positions):
+    import rolling_backtest
+    simulated = rolling_backtest.simulate_rolling_copula(windows['residuals'], copula_type, n_simulations, seed)
+    pnl = rolling_backtest.portfolio_pnl(simulated, windows['var_pred'], windows['mean_pred'], windows['prices'],
+                                         weights, positions)
+    VaR, ES = rolling_backtest.value_at_risk(pnl, alphas)
+    # P&L réalisé avec la même revalorisation que les tirages
+    exposure = np.asarray(weights) * positions * windows['prices']
+    realized = np.sum(np.expm1(windows['realized']) * exposure, axis=-1)
+    return {'VaR': VaR, 'ES': ES, 'realized': realized}
+
+
+def GARCH_backtest_stage(VaR, alpha, alphas):
+    backtest_statistics = pipeline.code_module('backtest_stats').backtest_statistics
+    k = list(alphas).index(alpha)
+    # backtest_statistics compare la VaR de t-1 au rendement de t
+    realized = np.append(np.nan, VaR['realized'])
+    forecasts = np.append(VaR['VaR'][:, k], np.nan)
+    statistics, _, _ = backtest_statistics(realized, forecasts[:, None], alpha)
+    return statistics
+
+
+def experiment_stages(experiment, grid, settings):
+    """
+    :return: étapes de l'expérience et nom de l'étape finale
+    """
+    alphas = list(grid['alpha'])
+    if experiment['family'] == 'MSM':
+        chain = pipeline.MSM_copula_pipeline(settings['MSM_source'], k_compos=experiment['k_compos'],
+                                             copula_type=experiment['copula_type'], alpha=experiment['alpha'],
+                                             seed=settings['seed'], last=settings['last'],
+                                             tolerance=settings['tolerance'], weights=settings['weights'])
+        return list(chain.stages.values()), 'backtest'
+    if experiment['family'] == 'classic':
+        window_size = experiment['window_size']
+        return [
+            Stage('classic_returns', classic_returns_stage,
+                  params={'source': settings['classic_source'], 'weights': settings['weights']}, cache=False),
+            Stage('classic_VaR', classic_VaR_stage, ['classic_returns'],
+                  {'window_size': window_size, 'alphas': alphas, 'weights': settings['weights']}),
+            Stage('classic_backtest', classic_backtest_stage, ['classic_returns', 'classic_VaR'],
+                  {'window_size': window_size, 'alpha': experiment['alpha'], 'alphas': alphas}),
+        ], 'classic_backtest'
+    return [
+        Stage('GARCH_windows', GARCH_windows_stage,
+              params={'source': settings['GARCH_source'], 'window_size': experiment['window_size'],
+                      'n_windows': settings['n_windows'], 'seed': settings['seed']}),
+        Stage('GARCH_VaR', GARCH_VaR_stage, ['GARCH_windows'],
+              {'copula_type': experiment['copula_type'], 'alphas': alphas, 'n_simulations': settings['n_simulations'],
+               'seed': settings['seed'], 'weights': settings['weights'], 'positions': settings['positions']}),
+        Stage('GARCH_backtest', GARCH_backtest_stage, ['GARCH_VaR'], {'alpha': experiment['alpha'], 'alphas': alphas}),
+    ], 'GARCH_backtest'
+
+
+def merge_stages(experiments, grid, settings, store):
+    """
+    Réunit les étapes de toutes les expériences ; une étape est identifiée par sa fonction, ses
+    paramètres et l'identité de ses entrées, les doublons ne sont gardés qu'une fois
+    :return: étapes (nommées nom@identité) et {nom de l'étape finale: [expériences]}
+    """
+    merged, targets = {}, {}
+    for experiment in experiments:
+        stages, target = experiment_stages(experiment, grid, settings)
+        stages = {stage.name: stage for stage in stages}
+        renamed = {}
+
+        def identify(name):
+            if name not in renamed:
+                stage = stages[name]
+                inputs = [identify(i) for i in stage.inputs]
+                identity = store.key(func=pipeline.stage_function(stage), params=stage.params, inputs=inputs)
+                renamed[name] = f'{name}@{identity[:10]}'
+                if renamed[name] not in merged:
+                    merged[renamed[name]] = Stage(renamed[name], stage.func, inputs, stage.params, stage.cache)
+            return renamed[name]
+
+        targets.setdefault(identify(target), []).append(experiment)
+    return list(merged.values()), targets
+
+
+def result_rows(experiment, statistics):
+    """
+    :return: DataFrame, une ligne par modèle testé, colonnes COLUMNS
+    """
+    names = np.ravel(statistics['model']) if 'model' in statistics else [experiment['family']]
+    keys = [key for key in statistics if key != 'model']
+    rows = []
+    for m, name in enumerate(names):
+        row = {'experiment': experiment_id(experiment), **experiment, 'model': str(name), 'status': 'ok'}
+        row.update({key: np.ravel(statistics[key])[m] for key in keys})
+        rows.append(row)
+    return pd.DataFrame(rows).reindex(columns=COLUMNS)
+
+
+def failed_row(experiment, error):
+    row = {'experiment': experiment_id(experiment), **experiment, 'model': experiment['family'],
+           'status': 'failed', 'error': f'{type(error).__name__}: {error}'}
+    return pd.DataFrame([row]).reindex(columns=COLUMNS)
+
+
+def run_sweep(grid=DEFAULT_GRID, families=tuple(FAMILY_AXES), n_jobs=4, checkpoint=CHECKPOINT, store=None,
+              retry_failed=False, **settings):
+    """
+    :param checkpoint: fichier csv de reprise, les expériences qui y figurent ne sont pas relancées
+    :param retry_failed: relancer aussi les expériences notées en échec dans le fichier de reprise
+    :return: table des résultats (une ligne par expérience et par modèle, statut 'ok' ou 'failed'),
+             durées des étapes
+    """
+    settings = {**DEFAULT_SETTINGS, **settings}
+    store = data_store.ModelStore(pipeline.PIPELINE_DIR) if store is None else store
+    experiments = []
+    for experiment in expand_grid(grid, families):
+        size = out_of_sample_size(experiment, settings)
+        if size is not None and size < settings['min_out_of_sample']:
+            print(f'{experiment_id(experiment)} ignorée : {size} dates de backtest '
+                  f'(min_out_of_sample={settings["min_out_of_sample"]})')
+            continue
+        experiments.append(experiment)
+    done = set()
+    if checkpoint is not None and os.path.exists(checkpoint):
+        previous = pd.read_csv(checkpoint, usecols=['experiment', 'status'])
+        if retry_failed:
+            previous = previous[previous['status'] != 'failed']
+        done = set(previous['experiment'])
+    todo = [experiment for experiment in experiments if experiment_id(experiment) not in done]
+
+    stages, targets = merge_stages(todo, grid, settings, store)
+    tables = []
+
+    def record(rows):
+        tables.append(rows)
+        if checkpoint is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(checkpoint)), exist_ok=True)
+            rows.to_csv(checkpoint, mode='a', index=False, header=not os.path.exists(checkpoint))
+
+    def on_complete(name, outputs):
+        for experiment in targets.get(name, []):
+            record(result_rows(experiment, outputs))
+
+    def on_error(name, error):
+        for experiment in targets.get(name, []):
+            record(failed_row(experiment, error))
+
+    runner = pipeline.Pipeline(stages, store, n_jobs)
+    runner.run(list(targets), on_complete, on_error)
+
+    if checkpoint is not None and os.path.exists(checkpoint):
+        table = pd.read_csv(checkpoint)
+        # un échec relancé (retry_failed) est remplacé par les lignes de sa dernière exécution
+        failed = table['status'] == 'failed'
+        stale = failed & (table['experiment'].isin(table.loc[~failed, 'experiment'])
+                          | table.duplicated('experiment', keep='last'))
+        table = table[~stale]
+    else:
+        table = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame(columns=COLUMNS)
+    ids = {experiment_id(experiment) for experiment in experiments}
+    return table[table['experiment'].isin(ids)].reset_index(drop=True), runner.timings
+
+
+if __name__ == "__main__":
+
+    results, timings = run_sweep()
+    pd.set_option('display.max_columns', None)
+    print(timings.groupby('status')['seconds'].agg(['count', 'sum']))
+    print(results)
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+Données communes aux tests de non-régression : les moteurs vectorisés sont comparés aux boucles
+d'origine (recopiées dans chaque test) sur datas/SP500NASDAQ.csv.
+"""
+import os
+import sys
+import numpy as np
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules de la racine (data_store, garch_kernel) et de code/ (moteurs du backtest)
+for directory in (ROOT_DIR, os.path.join(ROOT_DIR, 'code')):
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+
+import data_store
+
+WEIGHTS = np.array([0.5, 0.5])
+
+
+@pytest.fixture(scope='session')
+def returns_df():
+    """
+    Rendements log (en %) des deux indices et du portefeuille équipondéré, comme generate_var
+    """
+    df = data_store.load_prices('SP500NASDAQ.csv', complete=True).rename_axis('Dates').reset_index()
+    df['returns_SPX'] = np.log(df['SP500']).diff() * 100
+    df['returns_NDX'] = np.log(df['NASDAQCOM']).diff() * 100
+    df['returns_portfolio'] = WEIGHTS[0] * df['returns_SPX'] + WEIGHTS[1] * df['returns_NDX']
+    return df
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from backtest_stats import backtest_statistics, coverage_statistics, hit_matrix, transition_counts, window_bounds
+from rolling_moments import variance_covariance_VaR
+from rolling_quantile import rolling_quantiles
+from conftest import WEIGHTS
+
+ALPHAS = np.array([0.05, 0.01])
+
+
+def loop_christoffersen(hits, alpha):
+    """
+    Comptages et LR de l'ancien christoffersen_test sur une suite de dépassements, avec les deux
+    conventions de coverage_statistics : fréquence sur toutes les dates, H0 en n00 + n10 ;
+    LR NaN sans dépassement, comme l'ancien test
+    """
+    tr = hits[1:] - hits[:-1]  # Sequence to find transitions
+
+    # Transitions: nij denotes state i is followed by state j nij times
+    n01, n10 = (tr == 1).sum(), (tr == -1).sum()
+    n11, n00 = (hits[1:][tr == 0] == 1).sum(), (hits[1:][tr == 0] == 0).sum()
+
+    p = hits.mean()
+    if hits.sum() == 0:
+        return np.array([[n00, n01], [n10, n11]]), p, np.nan, np.nan
+
+    # Probabilities of the transitions from one state to another
+    p01, p11 = n01 / (n00 + n01), n11 / (n11 + n10)
+    p_pairs = (n01 + n11) / (n00 + n01 + n10 + n11)
+
+    # Unconditional Coverage
+    uc_h0 = (len(hits) - hits.sum()) * np.log(1 - alpha) + hits.sum() * np.log(alpha)
+    uc_h1 = (len(hits) - hits.sum()) * np.log(1 - p) + hits.sum() * np.log(p)
+    uc = -2 * (uc_h0 - uc_h1)
+
+    # Independence
+    ind_h0 = (n00 + n10) * np.log(1 - p_pairs) + (n01 + n11) * np.log(p_pairs)
+    ind_h1 = n00 * np.log(1 - p01) + n01 * np.log(p01) + n10 * np.log(1 - p11)
+    if p11 > 0:
+        ind_h1 += n11 * np.log(p11)
+    ind = -2 * (ind_h0 - ind_h1)
+
+    return np.array([[n00, n01], [n10, n11]]), p, uc, ind
+
+
+@pytest.fixture(scope='module')
+def backtest(returns_df):
+    """
+    Rendements du portefeuille et VaR historiques et variance-covariance sur 250 jours (T x 4)
+    """
+    x = returns_df[['returns_SPX', 'returns_NDX']].to_numpy()
+    returns = returns_df['returns_portfolio'].to_numpy()
+    VaR = np.column_stack([rolling_quantiles(returns, 250, ALPHAS * 100),
+                           variance_covariance_VaR(x, 250, WEIGHTS, ALPHAS)[:, 0, :]])
+    return returns, VaR, np.tile(ALPHAS, 2)
+
+
+@pytest.mark.parametrize('window, step', [(None, None), (250, 125)])
+def test_matches_loop(backtest, window, step):
+    returns, VaR, alpha = backtest
+    hits, valid = hit_matrix(returns, VaR)
+    statistics, starts, ends = backtest_statistics(returns, VaR, alpha, window, step)
+    counts, _, _ = transition_counts(hits, valid, starts, ends)
+    for k, (start, end) in enumerate(zip(starts, ends)):
+        for m in range(VaR.shape[1]):
+            # dates valides de la sous-période (VaR de la veille et rendement connus)
+            period_hits = hits[start:end, m][valid[start:end, m]]
+            expected_counts, p, uc, ind = loop_christoffersen(period_hits.astype(np.int64), alpha[m])
+            np.testing.assert_array_equal(counts[k, m], expected_counts)
+            assert statistics['EFV'][k, m] == pytest.approx(p, rel=1e-12)
+            if np.isnan(uc):
+                continue
+            assert statistics['LR_uc'][k, m] == pytest.approx(uc, rel=1e-12)
+            assert statistics['LR_ind'][k, m] == pytest.approx(ind, rel=1e-12)
+            assert statistics['LR_cc'][k, m] == pytest.approx(uc + ind, rel=1e-12)
+
+
+def test_sub_periods_cover_sample():
+    starts, ends = window_bounds(1000, 250, 100)
+    assert ends[-1] == 1000
+    np.testing.assert_array_equal(ends - starts, 250)
+    np.testing.assert_array_equal(np.diff(starts), 100)
+
+
+@pytest.mark.parametrize('sequence, expected', [
+    ([0, 1, 1, 1, 1, 0], 0.0),
+    ([0, 0, 0, 0, 1], np.nan),
+])
+def test_independence_edge_cases(sequence, expected):
+    hits = np.array(sequence, dtype=np.int8)[:, None]
+    valid = np.ones(hits.shape, dtype=bool)
+    valid[0] = False
+    starts, ends = window_bounds(len(hits))
+    counts, n_obs, n_hits = transition_counts(hits, valid, starts, ends)
+    statistics = coverage_statistics(counts, n_obs, n_hits, 0.05)
+    np.testing.assert_allclose(statistics['LR_ind'][0, 0], expected, atol=1e-12)
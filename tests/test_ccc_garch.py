@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+from arch import arch_model
+from scipy.stats import norm
+from ccc_garch import ccc_garch_VaR
+from conftest import WEIGHTS
+
+ASSETS = ['returns_SPX', 'returns_NDX']
+
+
+def loop_CCC_GARCH_VaR(df, weights, initial_window_size=1135, confidence_level=0.05):
+    # calculate_CCC_GARCH_VaR d'origine
+    df['VaR_CCC_GARCH'] = np.nan
+
+    volatilities = {asset: [] for asset in ['returns_SPX', 'returns_NDX']}
+    residuals = {asset: [] for asset in ['returns_SPX', 'returns_NDX']}
+    for asset in ['returns_SPX', 'returns_NDX']:
+        model = arch_model(df[asset][1:initial_window_size], vol='Garch', p=1, q=1, mean='Constant')
+        fitted = model.fit(disp='off')
+        volatilities[asset].extend(fitted.conditional_volatility.tolist())
+        residuals[asset].extend((fitted.resid / fitted.conditional_volatility).tolist())
+
+    for t in range(initial_window_size-1, len(df)):
+        for asset in ['returns_SPX', 'returns_NDX']:
+            model = arch_model(df[asset][1:t + 1], vol='Garch', p=1, q=1, mean='Constant')
+            res = model.fit(last_obs=t + 1, disp='off')
+            last_vol = res.conditional_volatility.iloc[-1]
+            last_res = res.resid.iloc[-1] / last_vol
+
+            volatilities[asset].append(last_vol)
+            residuals[asset].append(last_res)
+
+        current_residuals = pd.DataFrame({asset: res for asset, res in residuals.items()})
+        current_correlation = current_residuals.iloc[-initial_window_size:].corr().values
+
+        D_t = np.diag([volatilities[asset][t] for asset in ['returns_SPX', 'returns_NDX']])
+        Omega_t = D_t @ current_correlation @ D_t
+        portfolio_variance = weights @ Omega_t @ weights.T
+        mean_portfolio_return = 0
+        Z_alpha = norm.ppf(1 - confidence_level)
+        df.loc[t+1, 'VaR_CCC_GARCH'] = -(mean_portfolio_return + np.sqrt(portfolio_variance) * Z_alpha)
+
+    return df
+
+
+@pytest.fixture(scope='module')
+def expected(returns_df):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return loop_CCC_GARCH_VaR(returns_df[ASSETS].copy(), WEIGHTS)['VaR_CCC_GARCH'].to_numpy()
+
+
+def compute(returns_df, refit_every):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return ccc_garch_VaR(returns_df[ASSETS].to_numpy(), WEIGHTS, 1135, [0.05], refit_every)[:, 0]
+
+
+def test_daily_refit_matches_loop(returns_df, expected):
+    np.testing.assert_allclose(compute(returns_df, 1), expected, rtol=1e-12, atol=0)
+
+
+@pytest.mark.parametrize('refit_every, drift', [(5, 0.01), (20, 0.014)])
+def test_scheduled_refit_drift(returns_df, expected, refit_every, drift):
+    # écart documenté dans ccc_garch
+    VaR = compute(returns_df, refit_every)
+    np.testing.assert_array_equal(np.isnan(VaR), np.isnan(expected))
+    valid = ~np.isnan(expected)
+    assert np.max(np.abs(VaR[valid] / expected[valid] - 1)) <= drift
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from scipy.stats import norm
+from ewma import RISKMETRICS_LAMBDAS, ewma_covariance, ewma_portfolio_variance, ewma_VaR
+from conftest import WEIGHTS
+
+ASSETS = ['returns_SPX', 'returns_NDX']
+
+
+def loop_riskmetrics_VaR(df, weights, window_size=1135, lambda_param=0.94, confidence_level=0.05):
+    # riskmetrics_VaR d'origine
+    df['VaR_riskmetrics'] = np.nan
+
+    initial_window = df.iloc[:window_size]
+    cov_matrix = initial_window[['returns_SPX', 'returns_NDX']].cov()
+    initial_variance = np.dot(weights.T, np.dot(cov_matrix, weights))
+
+    df.loc[window_size-1, 'portfolio_variance'] = initial_variance
+    for i in range(window_size, len(df)):
+        yesterday_var = df.loc[i - 1, 'portfolio_variance']
+        today_return = df.loc[i, 'returns_portfolio']
+        today_var = lambda_param * yesterday_var + (1 - lambda_param) * today_return ** 2
+        df.loc[i, 'portfolio_variance'] = today_var
+        mean_returns = df[['returns_SPX', 'returns_NDX']].iloc[i-window_size:i].mean()
+
+        std_dev = np.sqrt(today_var)
+        Z_alpha = norm.ppf(1 - confidence_level)
+        df.loc[i, 'VaR_riskmetrics'] = -(mean_returns.dot(weights) + Z_alpha * std_dev)
+
+    return df
+
+
+@pytest.mark.parametrize('window_size', [1135, 250])
+def test_VaR_matches_loop(returns_df, window_size):
+    VaR = ewma_VaR(returns_df[ASSETS].to_numpy(), WEIGHTS, window_size, RISKMETRICS_LAMBDAS, [0.05, 0.01])
+    for l, lambda_param in enumerate(RISKMETRICS_LAMBDAS):
+        for k, alpha in enumerate([0.05, 0.01]):
+            expected = loop_riskmetrics_VaR(returns_df.copy(), WEIGHTS, window_size, lambda_param, alpha)
+            np.testing.assert_allclose(VaR[:, 0, l, k], expected['VaR_riskmetrics'], rtol=1e-12, atol=0)
+
+
+def test_covariance_matches_recursion(returns_df):
+    x = returns_df[ASSETS].to_numpy()[1:]
+    initial_cov = np.cov(x[:250], rowvar=False)
+    covariances = ewma_covariance(x, RISKMETRICS_LAMBDAS, initial_cov)
+    for l, lambda_param in enumerate(RISKMETRICS_LAMBDAS):
+        cov = initial_cov
+        for t in range(len(x)):
+            cov = lambda_param * cov + (1 - lambda_param) * np.outer(x[t], x[t])
+            np.testing.assert_allclose(covariances[l, t], cov, rtol=1e-10)
+
+
+def test_portfolio_variance_matches_covariance(returns_df):
+    x = returns_df[ASSETS].to_numpy()[1:]
+    weights = np.array([WEIGHTS, [0.8, 0.2], [1.0, -1.0]])
+    initial_cov = np.cov(x[:250], rowvar=False)
+    variance = ewma_portfolio_variance(x, weights, RISKMETRICS_LAMBDAS, initial_cov)
+    expected = np.einsum('ki,ltij,kj->tlk', weights, ewma_covariance(x, RISKMETRICS_LAMBDAS, initial_cov), weights)
+    np.testing.assert_allclose(variance, expected, rtol=1e-10)
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from scipy.optimize import approx_fprime, minimize
+from garch_kernel import GARCH_BOUNDS, garch_likelihood, optimize_garch
+
+THETAS = [np.array([0.05, 0.1, 0.85]), np.array([0.0, 0.2, 0.7]), np.array([-0.1, 0.05, 0.94])]
+
+
+def loop_likelihood(theta, returns, var_incondi):
+    # Garch.model d'origine
+    mu, alpha, beta = theta
+    w = (1 - alpha - beta) * var_incondi
+    e = np.concatenate([[0], (returns - mu)**2])
+    T = len(e)
+    var_condi = np.full(T, var_incondi)
+    for i in range(1, T):
+        var_condi[i] = w + alpha * e[i-1] + beta * var_condi[i-1]
+    var_condi[var_condi <= 0] = np.min(var_condi[var_condi > 0])
+    ll = 0.5 * np.log(2 * np.pi) + 0.5 * np.log(var_condi[1:]) + 0.5 * (e[1:] / var_condi[1:])
+    return np.sum(ll)
+
+
+@pytest.fixture(scope='module', params=['returns_SPX', 'returns_NDX'])
+def returns(request, returns_df):
+    return returns_df[request.param].to_numpy()[1:]
+
+
+@pytest.mark.parametrize('theta', THETAS)
+def test_likelihood_matches_loop(theta, returns):
+    nll, _, _ = garch_likelihood(theta, returns, np.var(returns))
+    assert nll == pytest.approx(loop_likelihood(theta, returns, np.var(returns)), rel=1e-12)
+
+
+@pytest.mark.parametrize('theta', THETAS)
+def test_gradient_matches_finite_differences(theta, returns):
+    _, grad, _ = garch_likelihood(theta, returns, np.var(returns))
+    numerical = approx_fprime(theta, loop_likelihood, 1e-7, returns, np.var(returns))
+    np.testing.assert_allclose(grad, numerical, rtol=1e-4, atol=1e-3)
+
+
+def test_optimum_matches_loop(returns):
+    var_incondi = np.var(returns)
+    theta = np.array([np.mean(returns), 0.1, 0.85])
+    _, nll, _ = optimize_garch(returns, var_incondi, theta)
+    # Garch.optim d'origine (gradient par différences finies)
+    expected = minimize(loop_likelihood, theta, args=(returns, var_incondi), bounds=GARCH_BOUNDS, tol=1e-8)
+    assert nll <= expected.fun + 1e-6
+    assert nll == pytest.approx(expected.fun, rel=1e-6)
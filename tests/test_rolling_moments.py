@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from scipy.stats import norm
+from rolling_moments import RollingMoments, rolling_moments, variance_covariance_VaR
+from conftest import WEIGHTS
+
+ASSETS = ['returns_SPX', 'returns_NDX']
+
+
+def loop_variance_covariance_method(df, weights, window_size=1135, confidence_level = 0.05):
+    # variance_covariance_method d'origine
+    df['Var_cov'] = np.nan
+
+    for i in range(window_size, len(df)):
+        window = df.iloc[i - window_size:i]
+        mean_returns = window[['returns_SPX', 'returns_NDX']].mean()
+        cov_matrix = window[['returns_SPX', 'returns_NDX']].cov()
+        portfolio_variance = np.dot(weights.T, np.dot(cov_matrix, weights))
+        portfolio_std = np.sqrt(portfolio_variance)
+        mean_portfolio_return = np.dot(weights, mean_returns)
+        Z_alpha = norm.ppf(1 - confidence_level)
+        VaR = -(mean_portfolio_return + portfolio_std * Z_alpha)
+        df.loc[df.index[i], 'Var_cov'] = VaR
+
+    return df
+
+
+@pytest.mark.parametrize('window_size', [1135, 60])
+def test_VaR_matches_loop(returns_df, window_size):
+    VaR = variance_covariance_VaR(returns_df[ASSETS].to_numpy(), window_size, WEIGHTS, [0.05, 0.01])
+    for k, alpha in enumerate([0.05, 0.01]):
+        expected = loop_variance_covariance_method(returns_df[ASSETS].copy(), WEIGHTS, window_size, alpha)
+        np.testing.assert_allclose(VaR[:, 0, k], expected['Var_cov'], rtol=1e-12, atol=0)
+
+
+def test_covariances_match_pandas(returns_df):
+    window_size = 60
+    mean, _, cov = rolling_moments(returns_df[ASSETS].to_numpy(), window_size, WEIGHTS)
+    # fenêtre [i - window_size, i) : valeurs pandas de la date i - 1
+    expected_cov = returns_df[ASSETS].rolling(window_size, min_periods=2).cov().to_numpy().reshape(-1, 2, 2)
+    expected_mean = returns_df[ASSETS].rolling(window_size, min_periods=2).mean().to_numpy() @ WEIGHTS
+    np.testing.assert_allclose(cov[window_size:], expected_cov[window_size - 1:-1], rtol=1e-10)
+    np.testing.assert_allclose(mean[window_size:, 0], expected_mean[window_size - 1:-1], rtol=1e-10)
+
+
+def test_push_matches_batch(returns_df):
+    window_size = 60
+    x = returns_df[ASSETS].to_numpy()
+    _, _, cov = rolling_moments(x, window_size, WEIGHTS)
+    stream = RollingMoments(len(ASSETS), window_size)
+    for i in range(1, len(x)):
+        stream.push(x[i - 1])
+        if i >= window_size:
+            np.testing.assert_allclose(stream.cov, cov[i], rtol=1e-10)
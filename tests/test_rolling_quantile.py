@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from rolling_quantile import rolling_quantiles
+
+PERCENTILES = [5, 1]
+
+
+def loop_historical_VaR(df, confidence_level, window_size=1135):
+    # historical_VaR d'origine
+    df['VaR_historique'] = np.nan
+    for i in range(window_size, len(df)):
+        df.loc[df.index[i], 'VaR_historique'] = np.percentile(df['returns_portfolio'].iloc[i-window_size:i].dropna(),
+                                                              confidence_level)
+    return df
+
+
+@pytest.mark.parametrize('window_size', [1135, 250, 20])
+def test_matches_loop(returns_df, window_size):
+    VaR = rolling_quantiles(returns_df['returns_portfolio'].to_numpy(), window_size, PERCENTILES)
+    for q, percentile in enumerate(PERCENTILES):
+        expected = loop_historical_VaR(returns_df[['returns_portfolio']].copy(), percentile, window_size)
+        np.testing.assert_allclose(VaR[:, q], expected['VaR_historique'], rtol=1e-12, atol=0)
+
+
+def test_missing_values_match_loop(returns_df):
+    # Trous dans la série : ignorés par dropna dans l'original
+    df = returns_df[['returns_portfolio']].copy()
+    df.loc[df.index[100:130], 'returns_portfolio'] = np.nan
+    df.loc[df.index[500::7], 'returns_portfolio'] = np.nan
+    VaR = rolling_quantiles(df['returns_portfolio'].to_numpy(), 250, PERCENTILES)
+    for q, percentile in enumerate(PERCENTILES):
+        expected = loop_historical_VaR(df.copy(), percentile, 250)
+        np.testing.assert_allclose(VaR[:, q], expected['VaR_historique'], rtol=1e-12, atol=0)
+
+
+def test_several_series(returns_df):
+    x = returns_df[['returns_SPX', 'returns_NDX']].to_numpy()
+    VaR = rolling_quantiles(x, 250, PERCENTILES)
+    for j in range(x.shape[1]):
+        np.testing.assert_array_equal(VaR[:, j], rolling_quantiles(x[:, j], 250, PERCENTILES))